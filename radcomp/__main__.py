@@ -0,0 +1,39 @@
+# coding: utf-8
+"""radcomp command line interface"""
+
+import argparse
+
+from radcomp import cache
+
+
+def cache_command(args):
+    """radcomp cache subcommand"""
+    if args.action == 'clear':
+        cache.clear()
+    elif args.action == 'evict':
+        for key in cache.evict(max_size=args.max_size):
+            print('removed {}'.format(key))
+    for line in cache.info():
+        print(line)
+
+
+def main(argv=None):
+    """Run radcomp command line interface."""
+    parser = argparse.ArgumentParser(prog='radcomp')
+    subparsers = parser.add_subparsers(dest='command')
+    cache_parser = subparsers.add_parser('cache', help='inspect or clear '
+                                         'cached results')
+    cache_parser.add_argument('action', nargs='?', default='info',
+                              choices=('info', 'clear', 'evict'))
+    cache_parser.add_argument('--max-size', type=float, default=cache.MAX_SIZE,
+                              help='size limit for evict in bytes')
+    cache_parser.set_defaults(func=cache_command)
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.print_help()
+        return
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,6 @@
 # coding: utf-8
+import hashlib
+from collections import OrderedDict
 import numpy as np
 import netCDF4 as nc
 import pandas as pd
@@ -6,6 +8,7 @@ from glob import glob
 from datetime import datetime
 from os import path
 from j24 import home
+from radcomp import CACHE_DIR
 
 
 arm_dir = path.join(home(), 'DATA', 'arm')
@@ -19,6 +22,9 @@ sounding_path = path.join(SOUNDING_DIR, sounding_f)
 SOUNDING_GLOB = path.join(SOUNDING_DIR, 'tmpsondewnpnM1.b1.20??????.??????.cdf')
 GROUND_GLOB = path.join(GROUND_DIR, 'tmpmetM1.b1.20??????.??????.cdf')
 MWR_GLOB = path.join(MWR_DIR, '*.cdf')
+MAX_OPEN_FILES = 32
+_catalogs = {}
+_handles = OrderedDict()
 #s = nc.Dataset(soundings_f)
 
 def time(ncdata, as_np=False):
@@ -55,17 +61,80 @@ def path2t(sounding_path):
     dtstr = ''.join(fname.split('.')[-3:-1])
     return datetime.strptime(dtstr, '%Y%m%d%H%M%S')
 
+def catalog_path(globfmt):
+    """catalog cache file path for a file name pattern"""
+    key = hashlib.md5(globfmt.encode()).hexdigest()
+    return path.join(CACHE_DIR, 'arm_catalog_{}.pkl'.format(key))
+
+def scan_catalog(globfmt=GROUND_GLOB):
+    """file paths indexed by time parsed from file names"""
+    files = pd.Series(glob(globfmt), dtype=object)
+    files.index = pd.DatetimeIndex(files.apply(path2t).values)
+    files.name = 'filepath'
+    return files.sort_index()
+
+def catalog(globfmt=GROUND_GLOB, refresh=False):
+    """sorted time index of data files
+
+    The index is scanned once and persisted in CACHE_DIR. It is rescanned when
+    the data directory has been modified since.
+    """
+    datadir = path.dirname(globfmt)
+    mtime = path.getmtime(datadir) if path.isdir(datadir) else None
+    if not refresh and globfmt in _catalogs:
+        cached_mtime, files = _catalogs[globfmt]
+        if cached_mtime == mtime:
+            return files
+    cachefile = catalog_path(globfmt)
+    if not refresh and path.exists(cachefile):
+        cached_mtime, files = pd.read_pickle(cachefile)
+        if cached_mtime == mtime:
+            _catalogs[globfmt] = (mtime, files)
+            return files
+    files = scan_catalog(globfmt)
+    pd.to_pickle((mtime, files), cachefile)
+    _catalogs[globfmt] = (mtime, files)
+    return files
+
+def open_dataset(filepath):
+    """netCDF Dataset from a bounded pool of open file handles"""
+    if filepath in _handles:
+        _handles.move_to_end(filepath)
+        return _handles[filepath]
+    while len(_handles) >= MAX_OPEN_FILES:
+        _, ncdata = _handles.popitem(last=False)
+        ncdata.close()
+    ncdata = nc.Dataset(filepath)
+    _handles[filepath] = ncdata
+    return ncdata
+
+def close_all():
+    """Close all pooled netCDF handles."""
+    while _handles:
+        _, ncdata = _handles.popitem()
+        ncdata.close()
+
+def files_in_timerange(tstart, tend, globfmt=GROUND_GLOB):
+    """data files overlapping a time range
+
+    Each file is assumed to cover the time until the start of the next one.
+    """
+    files = catalog(globfmt=globfmt)
+    t = files.index.values
+    i0 = max(np.searchsorted(t, np.datetime64(tstart), side='right')-1, 0)
+    i1 = np.searchsorted(t, np.datetime64(tend), side='right')
+    return files.iloc[i0:i1]
+
 def datalist(globfmt=GROUND_GLOB):
-    sounding_files = pd.Series(glob(globfmt))
-    t = sounding_files.apply(path2t)
-    ncs = sounding_files.apply(nc.Dataset)
-    ncs.index = t
+    ncs = catalog(globfmt=globfmt).apply(nc.Dataset)
     ncs.name = 'dataset'
-    return ncs.sort_index()
+    return ncs
 
 def nearest(i, df=None, **kws):
     if df is None:
-        df = datalist(**kws)
+        files = catalog(**kws)
+        fpath = files.iloc[np.argmin(np.abs(files.index - pd.Timestamp(i)))]
+        return open_dataset(fpath)
     return df.iloc[np.argmin(np.abs(df.index - pd.Timestamp(i)))]
 
 def mdf():
@@ -92,11 +161,72 @@ def df2series(df):
 def prep4pca(df):
     return df.apply(lambda x: df2series(resampled_t_dp(x))).dropna()
 
-def var_in_timerange(tstart, tend, var='temp_mean', globfmt=GROUND_GLOB):
-    gnc = datalist(globfmt=globfmt)
-    gnc.index = gnc.index.map(lambda t: t.date())
-    ncs = gnc.loc[tstart.date():tend.date()]
-    t = pd.concat(map(lambda x: nc2df(x, index='time')[var], ncs))
-    return t.loc[tstart:tend]
-
+def read_vars(files, variables):
+    """Read variables from many ARM files.
+
+    Record counts are read first to preallocate the output arrays, which are
+    then filled file by file. Each file is read right after (re)opening it,
+    so pooled handles evicted later in the loop are no longer needed.
+
+    Returns:
+        ndarray, dict: datetime64 timestamps and data arrays by variable
+    """
+    sizes = [open_dataset(f).variables['time_offset'].shape[0] for f in files]
+    ends = np.cumsum(sizes, dtype=int)
+    secs = np.empty(ends[-1] if sizes else 0)
+    data = {var: np.empty(secs.size) for var in variables}
+    for f, i1, size in zip(files, ends, sizes):
+        i0 = i1-size
+        ncdata = open_dataset(f)
+        t0 = ncdata.variables['base_time'][0]
+        secs[i0:i1] = t0 + np.asarray(ncdata.variables['time_offset'][:],
+                                      dtype=float)
+        for var in variables:
+            values = np.ma.asarray(ncdata.variables[var][:], dtype=float)
+            data[var][i0:i1] = values.filled(np.nan)
+    t = np.round(secs*1e3).astype('int64').astype('datetime64[ms]')
+    return t, data
+
+def vars_in_timerange(tstart, tend, variables=('temp_mean',),
+                      globfmt=GROUND_GLOB):
+    """timestamps and data arrays of variables between datetimes"""
+    files = files_in_timerange(tstart, tend, globfmt=globfmt)
+    t, data = read_vars(files, variables)
+    order = np.argsort(t, kind='stable')
+    t = t[order]
+    i0 = np.searchsorted(t, np.datetime64(tstart), side='left')
+    i1 = np.searchsorted(t, np.datetime64(tend), side='right')
+    return t[i0:i1], {var: data[var][order][i0:i1] for var in variables}
+
+def resample_mean(t, values, tstart, tend, freq='15min', base=0):
+    """mean of values in regular time bins between datetimes
+
+    Bins are aligned to midnight plus base minutes as in pandas resample.
+    """
+    step = pd.Timedelta(freq).to_timedelta64()
+    origin = (pd.Timestamp(tstart).floor('D') + pd.Timedelta(minutes=base))
+    origin = origin.to_datetime64()
+    i0 = (np.datetime64(tstart) - origin)//step
+    i1 = (np.datetime64(tend) - origin)//step
+    n = int(i1 - i0 + 1)
+    grid = pd.DatetimeIndex(origin + (i0 + np.arange(n))*step)
+    ibin = (t - origin)//step - i0
+    valid = (ibin >= 0) & (ibin < n) & ~np.isnan(values)
+    sums = np.bincount(ibin[valid], weights=values[valid], minlength=n)
+    counts = np.bincount(ibin[valid], minlength=n)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = sums/counts
+    return pd.Series(mean, index=grid)
+
+def resampled_vars(tstart, tend, variables=('temp_mean',), globfmt=GROUND_GLOB,
+                   **kws):
+    """variables averaged on a regular time grid between datetimes"""
+    t, data = vars_in_timerange(tstart, tend, variables=variables,
+                                globfmt=globfmt)
+    resampled = {var: resample_mean(t, data[var], tstart, tend, **kws)
+                 for var in variables}
+    return pd.DataFrame(resampled)
 
+def var_in_timerange(tstart, tend, var='temp_mean', globfmt=GROUND_GLOB):
+    t, data = vars_in_timerange(tstart, tend, variables=[var], globfmt=globfmt)
+    return pd.Series(data[var], index=pd.DatetimeIndex(t), name=var)
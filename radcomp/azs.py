@@ -1,15 +1,26 @@
 # coding: utf-8
 
+import hashlib
+
+import numpy as np
 import pandas as pd
 from glob import glob
 from os import path
 from scipy.io import loadmat
-from j24 import home, mldatenum2datetime
+from j24 import home
+from radcomp import CACHE_DIR
 
 datadir = path.join(home(), 'DATA', 'BAECC_1308_AVL')
 dataset = set(glob(path.join(datadir, 'Snow_*.mat')))
 P200SET = set(glob(path.join(datadir, 'Snow_*PL200.mat')))
 P400SET = dataset-P200SET
+MATLAB_EPOCH_DATENUM = 719529 # datenum of 1970-01-01
+_series = {}
+
+def datenum2datetime64(datenum):
+    """MATLAB datenums to datetime64 array"""
+    ms = np.round((np.asarray(datenum) - MATLAB_EPOCH_DATENUM)*86400e3)
+    return ms.astype('int64').astype('datetime64[ms]')
 
 def mat_data(filename):
     dat = loadmat(filename)
@@ -22,8 +33,8 @@ def mat_data(filename):
 def mat2series(filename, key='azs'):
     data = mat_data(filename)
     values = data[key].flatten()
-    t = list(map(mldatenum2datetime, data['time'].flatten()))
-    series = pd.Series(data=values, index=t)
+    t = datenum2datetime64(data['time'].flatten())
+    series = pd.Series(data=values, index=pd.DatetimeIndex(t))
     series.name = key
     return series
 
@@ -38,5 +49,39 @@ def load_series(datafiles=P400SET, **kws):
             pass
     return pd.concat(azss).sort_index()
 
+def source_id(datafiles):
+    """short hash of the data file list"""
+    content = '\n'.join(sorted(path.abspath(fn) for fn in datafiles))
+    return hashlib.md5(content.encode()).hexdigest()[:12]
+
+def cache_path(key='azs', datafiles=P400SET):
+    """cache file path of a series converted from datafiles"""
+    fname = 'baecc_{}_{}.pkl'.format(key, source_id(datafiles))
+    return path.join(CACHE_DIR, fname)
+
+def series(key='azs', datafiles=P400SET, refresh=False):
+    """series from all data files, converted once and cached
+
+    The converted series is kept in memory and in CACHE_DIR. The cache file is
+    updated when any of the data files is newer.
+    """
+    cache_key = (key, source_id(datafiles))
+    if cache_key in _series and not refresh:
+        return _series[cache_key]
+    cachefile = cache_path(key, datafiles)
+    newest = max([path.getmtime(fn) for fn in datafiles] or [0])
+    if (not refresh and path.exists(cachefile) and
+            path.getmtime(cachefile) >= newest):
+        data = pd.read_pickle(cachefile)
+    else:
+        data = load_series(datafiles=datafiles, key=key)
+        data.to_pickle(cachefile)
+    _series[cache_key] = data
+    return data
+
+def range_series(start, end, **kws):
+    """cached series between datetimes"""
+    return series(**kws).loc[start:end]
+
 if __name__ == '__main__':
     data = load_series()
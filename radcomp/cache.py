@@ -0,0 +1,135 @@
+# coding: utf-8
+"""size bounded result cache in CACHE_DIR
+
+Each cache entry is a directory of files. Entries are evicted in least
+recently used order when the total size exceeds the limit.
+"""
+
+import hashlib
+import json
+import shutil
+import time
+from os import path, listdir, rename, utime, walk
+
+from j24 import ensure_dir
+
+from radcomp import CACHE_DIR
+
+
+RESULTS_CACHE_DIR = path.join(CACHE_DIR, 'results')
+MAX_SIZE = 4e9 # bytes
+PARTIAL_SUFFIX = '.partial'
+
+
+def hash_key(*args, **kws):
+    """hash of json serializable arguments"""
+    content = json.dumps([args, kws], sort_keys=True, default=str)
+    return hashlib.md5(content.encode()).hexdigest()
+
+
+def entry_dir(key, cachedir=RESULTS_CACHE_DIR):
+    """directory of a cache entry"""
+    return path.join(cachedir, key)
+
+
+def exists(key, **kws):
+    """Check if cache entry exists."""
+    return path.isdir(entry_dir(key, **kws))
+
+
+def touch(key, **kws):
+    """Mark cache entry as recently used."""
+    utime(entry_dir(key, **kws))
+
+
+def create(key, **kws):
+    """Create an empty partial cache entry and return its directory.
+
+    The entry becomes visible only after calling commit.
+    """
+    partial = entry_dir(key, **kws) + PARTIAL_SUFFIX
+    shutil.rmtree(partial, ignore_errors=True)
+    return ensure_dir(partial)
+
+
+def commit(key, **kws):
+    """Make a partial cache entry visible."""
+    remove(key, **kws)
+    entrydir = entry_dir(key, **kws)
+    rename(entrydir + PARTIAL_SUFFIX, entrydir)
+
+
+def remove(key, **kws):
+    """Remove a cache entry if it exists."""
+    shutil.rmtree(entry_dir(key, **kws), ignore_errors=True)
+
+
+def _file_size(filepath):
+    """file size in bytes, 0 if removed meanwhile"""
+    try:
+        return path.getsize(filepath)
+    except OSError:
+        return 0
+
+
+def dir_size(dirpath):
+    """total size of files in a directory tree in bytes"""
+    size = 0
+    for root, _, files in walk(dirpath):
+        size += sum(_file_size(path.join(root, f)) for f in files)
+    return size
+
+
+def entries(cachedir=RESULTS_CACHE_DIR):
+    """(key, last used, size) of cache entries, least recently used first"""
+    if not path.isdir(cachedir):
+        return []
+    out = []
+    for key in listdir(cachedir):
+        dirpath = path.join(cachedir, key)
+        if key.endswith(PARTIAL_SUFFIX) or not path.isdir(dirpath):
+            continue
+        try:
+            mtime = path.getmtime(dirpath)
+        except OSError: # removed by another process
+            continue
+        out.append((key, mtime, dir_size(dirpath)))
+    return sorted(out, key=lambda entry: entry[1])
+
+
+def evict(max_size=MAX_SIZE, cachedir=RESULTS_CACHE_DIR):
+    """Remove least recently used entries until total size is below max_size.
+    """
+    ents = entries(cachedir=cachedir)
+    total = sum(entry[2] for entry in ents)
+    removed = []
+    for key, _, size in ents:
+        if total <= max_size:
+            break
+        remove(key, cachedir=cachedir)
+        total -= size
+        removed.append(key)
+    return removed
+
+
+def clear(cachedir=RESULTS_CACHE_DIR):
+    """Remove all cache entries."""
+    for key, _, _ in entries(cachedir=cachedir):
+        remove(key, cachedir=cachedir)
+
+
+def info(cachedir=RESULTS_CACHE_DIR):
+    """cache contents as printable lines"""
+    lines = []
+    total = 0
+    for key, mtime, size in reversed(entries(cachedir=cachedir)):
+        total += size
+        tstr = time.strftime('%Y-%m-%d %H:%M', time.localtime(mtime))
+        descfile = path.join(cachedir, key, 'description.txt')
+        desc = ''
+        if path.exists(descfile):
+            with open(descfile) as f:
+                desc = f.read().strip()
+        lines.append('{} {} {:8.1f} MB {}'.format(key, tstr, size/1e6, desc))
+    lines.append('total {:.1f} MB in {}'.format(total/1e6, cachedir))
+    return lines
@@ -1,13 +1,18 @@
 # coding: utf-8
-import itertools
+import queue
 import datetime
+import threading
+import multiprocessing
+from collections import deque
 import scipy.io
 import numpy as np
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from os import path
 from pyoptflow import utils
 from pyoptflow.core import extract_motion_proesmans
 from pyoptflow.interpolation import interpolate
+import radcomp.visualization as vis
 from radcomp.qpe import radx
 from j24 import ensure_dir
 
@@ -31,44 +36,133 @@ def motion(I1, I2):
     return extract_motion_proesmans(Iu[0], Iu[1], lam=25.0, num_iter=250, num_levels=6)
 
 
-def batch_interpolate(filepaths_good, outpath, data_site=None, save_png=False, 
-                      interval_s=10.):
+def data_site_of(filepath):
+    """radar site name in file path"""
+    for site in radx.SITES:
+        if site in filepath:
+            return site
+
+
+def selected_frames(t0, t1, interval_s=10.):
+    """Number of frames between t0 and t1 and (index, time) of those kept.
+
+    Frames are kept when they fall within the first 10 seconds of a minute.
+    """
     interval_dt = datetime.timedelta(seconds=interval_s)
-    for f0, f1 in itertools.izip(filepaths_good, filepaths_good[1:]):
-        if data_site is None:
-            for site in radx.SITES:
-                if site in f0:
-                    data_site = site
-        nc0 = radx.RADXgrid(f0)
-        nc1 = radx.RADXgrid(f1)
-        if data_site == 'KER':
-            nc0, nc1 = radx.equalize_ker_zmin(nc0, nc1)
-        r0 = nc0.rainrate()
-        r1 = nc1.rainrate()
-        t0 = nc0.elevation_end_time()
-        t1 = nc1.elevation_end_time()
-        dt = t1-t0
-        n = int(round(dt.total_seconds()/interval_s))
-        intrp_timestamps = [t0+i*interval_dt for i in range(1, n+1, 1)]
-        selection = [t.second<10 for t in intrp_timestamps]
-        print(dt.total_seconds())
-        intrp = np.array(interp(r0, r1, n))
-        for i in np.where(selection)[0]:
-            t = intrp_timestamps[i]
-            r = intrp[i]
-            datedir = t.strftime('%Y%m%d')
-            fbasename = t.strftime('intrp_%Y%m%d_%H%M%S')
-            matfname = fbasename + '.mat'
-            matsitepath = ensure_dir(path.join(outpath, data_site, 'R', 'mat', datedir))
-            matfilepath = path.join(matsitepath, matfname)
-            mdict = {'time': np.array(str(t)), 'R': r}
-            scipy.io.savemat(matfilepath, mdict, do_compression=True)
-            if save_png:
-                pngfname = fbasename + '.png'
-                pngsitepath = ensure_dir(path.join(outpath, data_site, 'R', 'png', datedir))
-                pngfilepath = path.join(pngsitepath, pngfname)
-                fig, ax = radx.plot_rainmap(r)
-                ax.set_title(str(t))
-                fig.savefig(pngfilepath, bbox_inches="tight")
-                plt.close(fig)
+    n = int(round((t1-t0).total_seconds()/interval_s))
+    times = [t0+i*interval_dt for i in range(1, n+1, 1)]
+    return n, [(i, t) for i, t in enumerate(times) if t.second < 10]
+
+
+def iter_pairs(filepaths, data_site=None, interval_s=10.):
+    """Interpolation tasks of consecutive grid pairs.
+
+    Each grid is read once and shared by the two pairs it belongs to. Pairs
+    without selected frames are skipped.
+    """
+    grid0 = None
+    for f0, f1 in zip(filepaths, filepaths[1:]):
+        site = data_site or data_site_of(f0)
+        if grid0 is None:
+            grid0 = radx.RADXgrid(f0)
+        grid1 = radx.RADXgrid(f1)
+        grid0.z_min = None
+        grid1.z_min = None
+        if site == 'KER':
+            grid0, grid1 = radx.equalize_ker_zmin(grid0, grid1)
+        t0 = grid0.elevation_end_time()
+        t1 = grid1.elevation_end_time()
+        n, frames = selected_frames(t0, t1, interval_s=interval_s)
+        if frames:
+            yield site, grid0.rainrate(), grid1.rainrate(), n, frames
+        grid0.close()
+        grid0 = grid1
+    if grid0 is not None:
+        grid0.close()
+
+
+def _interp_task(task):
+    """selected interpolated frames of a grid pair"""
+    site, r0, r1, n, frames = task
+    intrp = interp(r0, r1, n)
+    return [(site, t, np.array(intrp[i])) for i, t in frames]
+
+
+def save_frame(outpath, data_site, t, r, save_png=False):
+    """Save an interpolated rain rate frame as mat and optionally png.
+
+    The png is rendered on an Agg canvas without pyplot, so this can run in
+    a background thread.
+    """
+    datedir = t.strftime('%Y%m%d')
+    fbasename = t.strftime('intrp_%Y%m%d_%H%M%S')
+    matfname = fbasename + '.mat'
+    matsitepath = ensure_dir(path.join(outpath, data_site, 'R', 'mat', datedir))
+    matfilepath = path.join(matsitepath, matfname)
+    mdict = {'time': np.array(str(t)), 'R': r}
+    scipy.io.savemat(matfilepath, mdict, do_compression=True)
+    if save_png:
+        pngfname = fbasename + '.png'
+        pngsitepath = ensure_dir(path.join(outpath, data_site, 'R', 'png', datedir))
+        pngfilepath = path.join(pngsitepath, pngfname)
+        fig = Figure()
+        FigureCanvasAgg(fig)
+        ax = fig.add_subplot(111)
+        vis.plot_r(r, fig=fig, ax=ax)
+        ax.set_title(str(t))
+        fig.savefig(pngfilepath, bbox_inches="tight")
+
+
+def _writer(frames, errors, outpath, save_png):
+    """Save frames from a queue until None is received."""
+    while True:
+        item = frames.get()
+        if item is None:
+            return
+        try:
+            save_frame(outpath, *item, save_png=save_png)
+        except Exception as e:
+            errors.append(e)
+
+
+def batch_interpolate(filepaths_good, outpath, data_site=None, save_png=False,
+                      interval_s=10., processes=None):
+    """Interpolate and save rain rate frames between consecutive grids.
+
+    Motion extraction and interpolation of grid pairs run in a process
+    pool, at most two tasks per worker at a time, while frames are saved in a
+    background thread.
 
+    Args:
+        filepaths_good (list): RADX grid file paths in time order
+        outpath (str): output directory
+        data_site (str, optional): site name, guessed from file names if None
+        save_png (bool): also save frames as png
+        interval_s (float): interpolation time step in seconds
+        processes (int, optional): number of worker processes
+    """
+    frames = queue.Queue(maxsize=64)
+    errors = []
+    writer = threading.Thread(target=_writer,
+                              args=(frames, errors, outpath, save_png))
+    writer.start()
+    tasks = iter_pairs(filepaths_good, data_site=data_site,
+                       interval_s=interval_s)
+    max_pending = 2*(processes or multiprocessing.cpu_count())
+    pending = deque()
+    try:
+        with multiprocessing.Pool(processes) as pool:
+            for task in tasks:
+                pending.append(pool.apply_async(_interp_task, (task,)))
+                while pending and (len(pending) >= max_pending or
+                                   pending[0].ready()):
+                    for item in pending.popleft().get():
+                        frames.put(item)
+            while pending:
+                for item in pending.popleft().get():
+                    frames.put(item)
+    finally:
+        frames.put(None)
+        writer.join()
+    if errors:
+        raise errors[0]
@@ -1,12 +1,15 @@
 # coding: utf-8
 import numpy as np
 import netCDF4 as nc
-import copy
 import radcomp.visualization as vis
 from radcomp.qpe.radar import RADARS
 
 SITES = ['KUM', 'KER', 'VAN']
 
+# range and minimum detectable Z maps by site, task and grid geometry
+_RANGE_FIELDS = dict()
+_Z_MINS = dict()
+
 
 def equalize_ker_zmin(nc0, nc1):
     lvar0 = list(nc0.data.variables)
@@ -29,20 +32,62 @@ def lin2db(lin):
 
 
 class RADXgrid:
-    """RADX grid object"""
+    """RADX grid object
+
+    The file is kept open until close is called or the context manager
+    exits. Decoded variables are cached on first read.
+    """
     def __init__(self, filepath, rwmode='r'):
         self.filepath = filepath
         self.rwmode = rwmode
-        self.x = self.data.variables['x0'][:]
-        self.y = self.data.variables['y0'][:]
+        self._data = None
+        self._vars = dict()
+        self._site = None
+        self._scantime = None
+        self.x = self.variable('x0')
+        self.y = self.variable('y0')
         self._task_name = None
         self._radar_pixel = None
         self._z_min = None
         self.equalize_dbz = False
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
     @property
     def data(self):
-        return nc.Dataset(self.filepath, self.rwmode)
+        """open netCDF4 dataset"""
+        if self._data is None:
+            self._data = nc.Dataset(self.filepath, self.rwmode)
+        return self._data
+
+    def close(self):
+        """Close the dataset handle."""
+        if self._data is not None:
+            self._data.close()
+            self._data = None
+
+    def variable(self, name):
+        """decoded variable data, read once"""
+        if name not in self._vars:
+            self._vars[name] = self.data.variables[name][:]
+        return self._vars[name]
+
+    def layer(self, name):
+        """decoded lowest level of the first time step of a variable"""
+        key = (name, 0, 0)
+        if key not in self._vars:
+            self._vars[key] = self.data.variables[name][0, 0, :, :]
+        return self._vars[key]
+
+    def dbz_name(self):
+        """name of the reflectivity variable"""
+        if self.site() == 'KER':
+            return 'DBZ_TOT'
+        return 'DBZ'
 
     @property
     def task_name(self):
@@ -57,13 +102,16 @@ class RADXgrid:
         return self._task_name
 
     def site(self):
-        if 'Kerava' in self.data.title:
-            return 'KER'
-        if 'kum-' in self.data.title:
-            return 'KUM'
-        if 'VANTAA' in self.data.title:
-            return 'VAN'
-        return '???'
+        if self._site is None:
+            title = self.data.title
+            self._site = '???'
+            if 'Kerava' in title:
+                self._site = 'KER'
+            elif 'kum-' in title:
+                self._site = 'KUM'
+            elif 'VANTAA' in title:
+                self._site = 'VAN'
+        return self._site
 
     def radar(self):
         return RADARS[self.site()]
@@ -76,10 +124,10 @@ class RADXgrid:
     def radar_pixel(self):
         """(idy, idx)"""
         if self._radar_pixel is None:
-            ymid = self.data.dimensions['y0'].size/2
-            xmid = self.data.dimensions['x0'].size/2
-            lats = self.data.variables['lat0'][:,ymid]
-            lons = self.data.variables['lon0'][xmid,:]
+            ymid = self.data.dimensions['y0'].size//2
+            xmid = self.data.dimensions['x0'].size//2
+            lats = self.variable('lat0')[:,ymid]
+            lons = self.variable('lon0')[xmid,:]
             lat, lon = self.radar_latlon()
             y = np.abs(lats-lat).argmin()
             x = np.abs(lons-lon).argmin()
@@ -93,13 +141,11 @@ class RADXgrid:
         return 0.0292*self.z()**(0.6536)
 
     def dbz_raw(self):
-        if self.site() == 'KER':
-            return self.data.variables['DBZ_TOT']
-        return self.data.variables['DBZ']
+        return self.data.variables[self.dbz_name()]
 
     def dbz(self):
         """filtered and corrected DBZ"""
-        dbz = self.dbz_raw()[0,0,:,:]
+        dbz = self.layer(self.dbz_name())
         if self.site() == 'KER':
             dbz_corrected = dbz+17
         else:
@@ -111,8 +157,8 @@ class RADXgrid:
         return vis.plot_r(self.rainrate())
 
     def datetime(self, var='time'):
-        times = self.data.variables[var]
-        return nc.num2date(times[:], times.units)
+        units = self.data.variables[var].units
+        return nc.num2date(self.variable(var), units)
 
     def distance(self, x0, y0, x1, y1):
         dx = self.x[x1]-self.x[x0]
@@ -123,15 +169,26 @@ class RADXgrid:
         (x0, y0) = self.radar_pixel
         return self.distance(x0, y0, x, y)
 
+    def geometry_key(self):
+        """site and grid geometry identifier"""
+        return (self.site(), self.radar_pixel, self.x.tobytes(),
+                self.y.tobytes())
+
     def range_field(self):
-        ran = self.data.variables['lat0'][:].copy()
-        for (x,y), element in np.ndenumerate(ran):
-            ran[y, x] = self.distance_from_radar(x, y)
-        return ran
+        """(y, x) map of distance from radar, shared between grids"""
+        key = self.geometry_key()
+        if key not in _RANGE_FIELDS:
+            (x0, y0) = self.radar_pixel
+            dx = np.asarray(self.x-self.x[x0])
+            dy = np.asarray(self.y-self.y[y0])
+            _RANGE_FIELDS[key] = np.hypot(dx[np.newaxis, :], dy[:, np.newaxis])
+        return _RANGE_FIELDS[key]
 
     def scantime(self):
-        ts=self.datetime('time_bounds')[0]
-        return ts[1]-ts[0]
+        if self._scantime is None:
+            ts = self.datetime('time_bounds')[0]
+            self._scantime = ts[1]-ts[0]
+        return self._scantime
 
     def elevationtime(self):
         """scan time per elevation"""
@@ -142,25 +199,39 @@ class RADXgrid:
             raise ValueError('There are not that many elevations.')
         return self.datetime('start_time')[0] + n*self.elevationtime()
 
-    def z_min_xy(self, x, y):
-        dist_term = 20*np.log10(self.distance_from_radar(x, y))
+    def z_min_params(self):
+        """calibration constant and log receiver term, None if unknown"""
         if self.task_name == 'KER_FMIB' or (self.site()=='KER' and self.equalize_dbz):
-            z_cal = -35.25
-            log = 2.5
-        elif self.task_name == 'VOL_A':
-            z_cal = -46.62
-            log = 1.5
-        else:
+            return -35.25, 2.5
+        if self.task_name == 'VOL_A':
+            return -46.62, 1.5
+        return None
+
+    def z_min_xy(self, x, y):
+        params = self.z_min_params()
+        if params is None:
             return
-        return z_cal + log + dist_term
+        z_cal, log = params
+        return z_cal + log + 20*np.log10(self.distance_from_radar(x, y))
 
     @property
     def z_min(self):
+        """(y, x) map of minimum detectable Z, shared between grids"""
         if self._z_min is None:
-            z_min = copy.deepcopy(self.dbz_raw()[0,0,:,:])
-            for (x, y), val in np.ndenumerate(z_min):
-                z_min[x, y] = self.z_min_xy(x, y)
-            self._z_min = z_min
+            params = self.z_min_params()
+            key = self.geometry_key() + (params,)
+            if key not in _Z_MINS:
+                ran = self.range_field()
+                if params is None:
+                    # fully masked, nan data compares False in mask()
+                    z_min = np.ma.masked_array(np.full(ran.shape, np.nan),
+                                               mask=True)
+                else:
+                    z_cal, log = params
+                    with np.errstate(divide='ignore'):
+                        z_min = np.ma.masked_array(z_cal+log+20*np.log10(ran))
+                _Z_MINS[key] = z_min
+            self._z_min = _Z_MINS[key]
         return self._z_min
 
     @z_min.setter
@@ -169,9 +240,9 @@ class RADXgrid:
 
     def mask(self):
         if self.site() == 'KER':
-            bad_dbz = self.dbz_raw()[0, 0, :, :].data < self.z_min.data
+            bad_dbz = self.layer(self.dbz_name()).data < self.z_min.data
         else:
-            bad_dbz = self.dbz_raw()[0, 0, :, :].mask
-        low_rhohv = self.data.variables['RHOHV'][0, 0, :, :] < 0.85
+            bad_dbz = np.ma.getmaskarray(self.layer(self.dbz_name()))
+        low_rhohv = self.layer('RHOHV') < 0.85
         return np.logical_or(bad_dbz, low_rhohv)
 
@@ -19,6 +19,17 @@ def round_hours(timestamp, hres=12):
     return tt - dt
 
 
+def sounding_times(t_start, t_end, hres=12):
+    """sounding launch times covering a time range"""
+    t0 = round_hours(t_start, hres=hres)
+    if t0 > t_start:
+        t0 -= timedelta(hours=hres)
+    t1 = round_hours(t_end, hres=hres)
+    if t1 < t_end:
+        t1 += timedelta(hours=hres)
+    return pd.date_range(t0, t1, freq='{}H'.format(hres))
+
+
 def sounding_url(t, dtype='text'):
     out_type = dict(pdf='PDF%3ASTUVE', text='TEXT%3ASIMPLE')
     baseurl = 'http://weather.uwyo.edu/cgi-bin/sounding'
@@ -78,6 +89,98 @@ def cache_read(timestamp, **kws):
     return pd.read_hdf(*cache_filename_key(timestamp, **kws))
 
 
+def interp_profile(data, heights, var='TEMP'):
+    """sounding variable interpolated to given heights
+
+    Values below the lowest sounding level are NaN, values above the highest
+    level repeat the topmost value.
+    """
+    col = data[var].dropna()
+    col = col[~col.index.duplicated()].sort_index()
+    if col.empty:
+        return np.full(len(heights), np.nan)
+    return np.interp(heights, col.index.values, col.values, left=np.nan)
+
+
+def interp_time(t_src, profiles, t_target):
+    """Linearly interpolate (height, time) profiles to target times.
+
+    NaN outside the time span of t_src.
+    """
+    x_src = np.asarray(t_src, dtype='datetime64[s]').astype(np.int64)
+    x = np.asarray(t_target, dtype='datetime64[s]').astype(np.int64)
+    out = np.full((profiles.shape[0], x.size), np.nan)
+    if x_src.size == 0:
+        return out
+    if x_src.size == 1:
+        out[:, x == x_src[0]] = profiles[:, :1]
+        return out
+    i1 = np.clip(np.searchsorted(x_src, x), 1, x_src.size-1)
+    i0 = i1-1
+    w = (x-x_src[i0])/(x_src[i1]-x_src[i0])
+    valid = (x >= x_src[0]) & (x <= x_src[-1])
+    out[:, valid] = (profiles[:, i0[valid]]*(1-w[valid]) +
+                     profiles[:, i1[valid]]*w[valid])
+    return out
+
+
+class SoundingProfiles:
+    """
+    Sounding data interpolated to a fixed height grid.
+
+    Soundings are read only once per launch time and kept in memory, so the
+    same object can be used for several cases or a MultiCase time axis.
+
+    Attributes:
+        heights (array_like): target height grid
+        var (str): sounding variable name
+        hres (int): sounding interval in hours
+    """
+
+    def __init__(self, heights, var='TEMP', hres=12):
+        self.heights = np.asarray(heights, dtype=float)
+        self.var = var
+        self.hres = hres
+        self._profiles = {}
+
+    def profile(self, t):
+        """sounding profile on the height grid, None if not available"""
+        if t not in self._profiles:
+            try:
+                data = read_sounding(t, index_col='HGHT')
+                self._profiles[t] = interp_profile(data, self.heights,
+                                                   var=self.var)
+            except pd.errors.ParserError:
+                self._profiles[t] = None
+        return self._profiles[t]
+
+    def profiles(self, t_start, t_end):
+        """launch times and (height, time) profiles covering a time range"""
+        times = []
+        profs = []
+        for t in sounding_times(t_start, t_end, hres=self.hres):
+            prof = self.profile(t)
+            if prof is None:
+                continue
+            times.append(t)
+            profs.append(prof)
+        if not profs:
+            return pd.DatetimeIndex(times), np.empty((self.heights.size, 0))
+        return pd.DatetimeIndex(times), np.column_stack(profs)
+
+    def interp(self, times):
+        """(height, time) array of sounding data at given times"""
+        times = pd.DatetimeIndex(times)
+        t_src, profs = self.profiles(times.min(), times.max())
+        return interp_time(t_src.values, profs, times.values)
+
+    def to_df(self, times):
+        """interpolated sounding data as height by time DataFrame"""
+        times = pd.DatetimeIndex(times)
+        return pd.DataFrame(self.interp(times), index=self.heights,
+                            columns=times)
+
+
 def create_pn(freq='12H'):
     dt_start = pd.datetime(2015, 11, 1, 00)
     dt_end = pd.datetime(2016, 4, 1, 00)
@@ -7,6 +7,9 @@ import numpy as np
 import pandas as pd
 
 
+DB_SCALED_VARS = ('ZH', 'ZDR')
+
+
 def db2lin(db):
     """decibels to linear scale"""
     return np.power(10, db/10)
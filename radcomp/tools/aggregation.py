@@ -0,0 +1,145 @@
+# coding: utf-8
+"""aggregation of stacked radar fields with dB fields in linear space
+
+Fields are stacked to a single (field, ..., gate) float32 array, which is
+converted to linear scale in place for dB fields, aggregated along the last
+axis in one call and converted back. Stacking work arrays are reused between
+calls of the same shape.
+"""
+
+import warnings
+from collections import OrderedDict
+
+import numpy as np
+
+from radcomp.tools import DB_SCALED_VARS
+
+
+DTYPE = np.float32
+MAX_WORK_BUFFERS = 8
+
+_work = OrderedDict()
+
+
+def work_buffer(shape, dtype=DTYPE):
+    """reusable work array of a shape and dtype
+
+    Up to MAX_WORK_BUFFERS most recently used arrays are kept.
+    """
+    key = (tuple(shape), np.dtype(dtype).str)
+    if key in _work:
+        _work.move_to_end(key)
+    else:
+        _work[key] = np.empty(shape, dtype=dtype)
+        while len(_work) > MAX_WORK_BUFFERS:
+            _work.popitem(last=False)
+    return _work[key]
+
+
+def stack(fields, keys, mask=None, window=slice(None), out=None,
+          dtype=DTYPE):
+    """Stack fields to a (field, ray, gate) array.
+
+    Masked gates and gates outside the boolean mask are nan.
+
+    Args:
+        fields (dict): 2D masked arrays
+        keys (list): stacked field names
+        mask (array, optional): boolean mask of valid gates within window
+        window (slice): gates to extract
+        out (array, optional): output array, a reusable work buffer if None
+        dtype (dtype): output data type
+
+    Returns:
+        array: stacked fields
+    """
+    shape = (len(keys),) + fields[keys[0]][:, window].shape
+    if out is None:
+        out = work_buffer(shape, dtype=dtype)
+    out.fill(np.nan)
+    for i, key in enumerate(keys):
+        var = fields[key][:, window]
+        valid = ~np.ma.getmaskarray(var)
+        if mask is not None:
+            valid &= mask
+        np.copyto(out[i], np.ma.getdata(var), where=valid, casting='unsafe')
+    return out
+
+
+def db_index(keys, db_vars=DB_SCALED_VARS):
+    """indices of dB scaled fields"""
+    return np.flatnonzero(np.isin(keys, db_vars))
+
+
+def to_linear(stacked, idb):
+    """Convert fields idb of stacked from dB to linear scale in place."""
+    for i in idb:
+        np.multiply(stacked[i], 0.1, out=stacked[i])
+        np.power(10, stacked[i], out=stacked[i])
+    return stacked
+
+
+def to_db(stacked, idb):
+    """Convert fields idb of stacked from linear to dB scale in place."""
+    for i in idb:
+        np.log10(stacked[i], out=stacked[i])
+        np.multiply(stacked[i], 10, out=stacked[i])
+    return stacked
+
+
+def _median(a, axis, out):
+    """nanmedian overwriting input"""
+    return np.nanmedian(a, axis=axis, out=out, overwrite_input=True)
+
+
+def _stat_fun(stat):
+    """aggregation function taking array, axis and out arguments"""
+    if stat in ('median', np.nanmedian):
+        return _median
+    if stat in ('mean', np.nanmean):
+        return np.nanmean
+    if not callable(stat):
+        raise ValueError('Unknown aggregation {}'.format(stat))
+    def fun(a, axis, out):
+        np.copyto(out, stat(a, axis=axis), casting='unsafe')
+        return out
+    return fun
+
+
+def aggregate(stacked, keys, stat='median', q=None,
+              db_vars=DB_SCALED_VARS, out=None):
+    """Aggregate stacked fields along the last axis.
+
+    dB fields are aggregated in linear space, overwriting stacked.
+
+    Args:
+        stacked (array): (field, ..., gate) array
+        keys (list): field names
+        stat (str or function): 'mean', 'median', 'percentile' or a function
+            taking axis argument
+        q (float or array): percentiles for stat='percentile'
+        db_vars (iterable): dB scaled field names
+        out (array, optional): output array
+
+    Returns:
+        array: aggregated values of shape stacked.shape[:-1], prepended with
+            percentile dimension when q is an array
+    """
+    idb = db_index(keys, db_vars=db_vars)
+    to_linear(stacked, idb)
+    shape = stacked.shape[:-1]
+    is_pct = isinstance(stat, str) and (stat == 'percentile')
+    if is_pct:
+        shape = np.shape(q) + shape
+    if out is None:
+        out = np.empty(shape, dtype=stacked.dtype)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        if is_pct:
+            np.nanpercentile(stacked, q, axis=-1, out=out,
+                             overwrite_input=True)
+        else:
+            _stat_fun(stat)(stacked, axis=-1, out=out)
+    field_axis = np.ndim(q) if is_pct else 0
+    to_db(np.moveaxis(out, field_axis, 0), idb)
+    return out
@@ -0,0 +1,259 @@
+# coding: utf-8
+"""specific differential phase retrieval with result caching
+
+KDP retrieval methods are registered by name. Retrieved KDP and filtered
+differential phase of the computed gate window are kept in a size bounded
+cache per input file, method parameters and gate window, and computing time
+is recorded per method.
+"""
+
+import time
+import multiprocessing
+from os import path, stat
+from copy import deepcopy
+from collections import defaultdict
+
+import pyart
+import numpy as np
+import pandas as pd
+
+from j24 import eprint
+
+from radcomp import CACHE_DIR, cache
+
+
+KDP_CACHE_DIR = path.join(CACHE_DIR, 'kdp')
+KDP_MAX_SIZE = 2e9 # bytes
+CACHE_FNAME = 'kdp.npz'
+MARGIN = 5e3 # m, gates around the range window used for phase filtering
+FILL_VALUE = -32768
+METHODS = dict()
+TIMINGS = defaultdict(list)
+
+
+def register(name):
+    """Register KDP method fun(radar, **params) -> (kdp, fdp)."""
+    def decorator(fun):
+        METHODS[name] = fun
+        return fun
+    return decorator
+
+
+@register('csu')
+def csu(radar, thsd=12, gs=125.0, window=10, **kws):
+    """CSU KDP and filtered differential phase
+
+    Parameters of other methods in kws are ignored.
+    """
+    from csu_radartools import csu_kdp
+    dz_ma = radar.fields['reflectivity']['data']
+    dz = dz_ma.filled(fill_value=FILL_VALUE)
+    dp_ma = radar.fields['differential_phase']['data']
+    dp = dp_ma.filled(fill_value=FILL_VALUE)
+    rng2d, _ = np.meshgrid(radar.range['data'], radar.elevation['data'])
+    kd, fd, sd = csu_kdp.calc_kdp_bringi(dp=dp, dz=dz, rng=rng2d/1000.0,
+                                         thsd=thsd, gs=gs, window=window)
+    mask = np.ma.getmaskarray(dz_ma)
+    return tuple(np.ma.masked_array(x, mask=(x == FILL_VALUE) | mask)
+                 for x in (kd, fd))
+
+
+@register('maesaka')
+def maesaka(radar, **kws):
+    """Maesaka KDP and filtered differential phase"""
+    mask = np.ma.getmaskarray(radar.fields['differential_phase']['data'])
+    try:
+        kdp_m = pyart.retrieve.kdp_maesaka(radar, **kws)
+    except IndexError:
+        # outlier checking sometimes causes trouble (with weak kdp?)
+        eprint('Skipping outlier check.')
+        kdp_m = pyart.retrieve.kdp_maesaka(radar, check_outliers=False,
+                                           **kws)
+    return tuple(np.ma.masked_array(data=d['data'], mask=mask)
+                 for d in kdp_m[:2])
+
+
+def subset_gates(radar, gates):
+    """copy of radar object limited to a slice of gates"""
+    fields = radar.fields
+    radar.fields = dict()
+    try:
+        sub = deepcopy(radar)
+    finally:
+        radar.fields = fields
+    sub.range = dict(radar.range, data=radar.range['data'][gates])
+    sub.ngates = sub.range['data'].size
+    sub.fields = {name: dict(field, data=field['data'][:, gates])
+                  for name, field in fields.items()}
+    sub.init_gate_x_y_z()
+    sub.init_gate_longitude_latitude()
+    sub.init_gate_altitude()
+    return sub
+
+
+def file_key(filename):
+    """identifier of file path and version"""
+    st = stat(filename)
+    return '{}:{}:{}'.format(path.abspath(filename), st.st_mtime, st.st_size)
+
+
+def cache_key(source, method, gates, params):
+    """cache key of a KDP retrieval"""
+    return cache.hash_key(file_key(source), method, gates.start, gates.stop,
+                          params)
+
+
+def save(key, kdp, fdp):
+    """Cache KDP and FDP of the gate window and evict old entries."""
+    entrydir = cache.create(key, cachedir=KDP_CACHE_DIR)
+    np.savez_compressed(path.join(entrydir, CACHE_FNAME),
+                        kdp=kdp.filled(np.nan), fdp=fdp.filled(np.nan))
+    cache.commit(key, cachedir=KDP_CACHE_DIR)
+    cache.evict(max_size=KDP_MAX_SIZE, cachedir=KDP_CACHE_DIR)
+
+
+def load(key, gates, shape):
+    """cached KDP and FDP expanded to full shape, None if not cached"""
+    filepath = path.join(cache.entry_dir(key, cachedir=KDP_CACHE_DIR),
+                         CACHE_FNAME)
+    try:
+        with np.load(filepath) as data:
+            window = [np.ma.masked_invalid(data[name])
+                      for name in ('kdp', 'fdp')]
+        cache.touch(key, cachedir=KDP_CACHE_DIR)
+    except OSError: # missing or evicted by another process
+        return None
+    return tuple(_expand(x, gates, shape) for x in window)
+
+
+def _expand(x, gates, shape):
+    """masked array of full shape with values in gates"""
+    out = np.ma.masked_all(shape, dtype=float)
+    out[:, gates] = x
+    return out
+
+
+def _compute(radar, method, params):
+    """KDP, FDP and computing time in seconds"""
+    t0 = time.time()
+    kdp, fdp = METHODS[method](radar, **params)
+    return kdp, fdp, time.time()-t0
+
+
+def _prepare(radar, method, gates, source, params):
+    """gate slice, cache key and cached result if available"""
+    if method not in METHODS:
+        raise ValueError('Unknown KDP method.')
+    if gates is None:
+        gates = slice(0, radar.ngates)
+    if source is None:
+        return gates, None, None
+    key = cache_key(source, method, gates, params)
+    return gates, key, load(key, gates, (radar.nrays, radar.ngates))
+
+
+def _finish(radar, gates, key, method, result):
+    """Record timing, cache and expand to full shape."""
+    kdp, fdp, seconds = result
+    TIMINGS[method].append(seconds)
+    if key is not None:
+        save(key, kdp, fdp)
+    shape = (radar.nrays, radar.ngates)
+    return tuple(_expand(x, gates, shape) for x in (kdp, fdp))
+
+
+def _empty(radar):
+    """fully masked KDP and FDP"""
+    shape = (radar.nrays, radar.ngates)
+    return np.ma.masked_all(shape), np.ma.masked_all(shape)
+
+
+def _subset(radar, gates):
+    """radar limited to gates if needed"""
+    if gates == slice(0, radar.ngates):
+        return radar
+    return subset_gates(radar, gates)
+
+
+def retrieve(radar, method='csu', gates=None, source=None, **params):
+    """KDP and filtered differential phase using a registered method.
+
+    Args:
+        radar (Radar): radar object
+        method (str): name of a registered method
+        gates (slice, optional): gates to compute, others are masked
+        source (str, optional): input file path used for caching
+        **params: method parameters
+
+    Returns:
+        kdp, fdp (MaskedArray): arrays of radar field shape
+    """
+    gates, key, cached = _prepare(radar, method, gates, source, params)
+    if cached is not None:
+        return cached
+    if gates.start >= gates.stop:
+        return _empty(radar)
+    result = _compute(_subset(radar, gates), method, params)
+    return _finish(radar, gates, key, method, result)
+
+
+def retrieve_many(radar, methods, gates=None, source=None, processes=None):
+    """KDP and FDP using multiple methods in a process pool.
+
+    Methods are computed in-process when only one needs computing, when
+    processes is less than 2 or when called from a daemonic worker process.
+
+    Args:
+        radar (Radar): radar object
+        methods (dict): method name to parameters mapping
+        gates (slice, optional): gates to compute, others are masked
+        source (str, optional): input file path used for caching
+        processes (int, optional): number of worker processes
+
+    Returns:
+        dict: method name to (kdp, fdp) mapping
+    """
+    results = dict()
+    todo = dict()
+    for method, params in methods.items():
+        g, key, cached = _prepare(radar, method, gates, source, params)
+        if cached is not None:
+            results[method] = cached
+        elif g.start >= g.stop:
+            results[method] = _empty(radar)
+        else:
+            todo[method] = g, key
+    if not todo:
+        return results
+    sub = _subset(radar, next(iter(todo.values()))[0])
+    tasks = [(sub, method, methods[method]) for method in todo]
+    serial = ((len(tasks) < 2) or (processes is not None and processes < 2)
+              or multiprocessing.current_process().daemon)
+    if serial:
+        computed = [_compute(*task) for task in tasks]
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            computed = pool.starmap(_compute, tasks)
+    for (method, (g, key)), result in zip(todo.items(), computed):
+        results[method] = _finish(radar, g, key, method, result)
+    return results
+
+
+def pop_timings():
+    """Return and clear computing times recorded in this process."""
+    timings = {method: list(t) for method, t in TIMINGS.items()}
+    TIMINGS.clear()
+    return timings
+
+
+def merge_timings(timings):
+    """Add computing times recorded in another process."""
+    for method, t in timings.items():
+        TIMINGS[method].extend(t)
+
+
+def timing_summary():
+    """count, mean and total computing time per KDP method"""
+    stats = {method: pd.Series(t).agg(['count', 'mean', 'sum'])
+             for method, t in TIMINGS.items()}
+    return pd.DataFrame(stats).T
@@ -0,0 +1,134 @@
+# coding: utf-8
+"""streaming NetCDF4 writer of vertical profile time series
+
+Profiles are appended one at a time along an unlimited time dimension and
+flushed to disk, so that an interrupted extraction keeps all profiles
+written so far. Reopening an existing file continues appending and skips
+timestamps already stored. Output files can be read using xarray and
+Case.from_nc.
+"""
+
+from os import path, remove
+
+import numpy as np
+import pandas as pd
+import netCDF4 as nc
+
+
+TIME_UNITS = 'seconds since 1970-01-01 00:00:00'
+DTYPE = 'f4'
+
+
+class ProfileWriter:
+    """append-only writer of (time, height) profile variables
+
+    The height axis is fixed on file creation, either to the given heights
+    or those of the first profile. Profiles on other heights are linearly
+    interpolated onto the axis, and axis heights outside a profile are nan.
+
+    Attributes:
+        filepath (str): output file path
+        times (set): timestamps stored in the file
+    """
+
+    def __init__(self, filepath, heights=None, overwrite=False):
+        self.filepath = filepath
+        self.times = set()
+        self._heights = heights
+        self._ds = None
+        if path.exists(filepath) and overwrite:
+            remove(filepath)
+        elif path.exists(filepath):
+            self._ds = nc.Dataset(filepath, 'a')
+            if not self._ds.dimensions['time'].isunlimited():
+                self.close()
+                raise ValueError('{} is not appendable'.format(filepath))
+            self.times = set(self._stored_times())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __contains__(self, t):
+        return pd.Timestamp(t) in self.times
+
+    def covers(self, t0, t1):
+        """whether a profile between times t0 and t1 is stored"""
+        t0, t1 = pd.Timestamp(t0), pd.Timestamp(t1)
+        return any(t0 <= t < t1 for t in self.times)
+
+    def _stored_times(self):
+        """timestamps in the file"""
+        t = self._ds.variables['time']
+        dates = nc.num2date(t[:], t.units, only_use_cftime_datetimes=False,
+                            only_use_python_datetimes=True)
+        return pd.to_datetime(dates)
+
+    @property
+    def heights(self):
+        """height axis of the file, None before the first profile"""
+        if self._ds is None:
+            return None
+        return self._ds.variables['height'][:]
+
+    def _create(self, heights):
+        """Create the output file with the given height axis."""
+        ds = nc.Dataset(self.filepath, 'w', format='NETCDF4')
+        ds.createDimension('time', None)
+        ds.createDimension('height', heights.size)
+        t = ds.createVariable('time', 'f8', ('time',))
+        t.units = TIME_UNITS
+        t.calendar = 'standard'
+        h = ds.createVariable('height', 'f8', ('height',))
+        h.units = 'm'
+        h[:] = heights
+        self._ds = ds
+
+    def _align(self, df):
+        """profile interpolated to the height axis"""
+        heights = np.asarray(self.heights, dtype=float)
+        h = np.asarray(df.index, dtype=float)
+        order = np.argsort(h)
+        values = np.asarray(df.values, dtype=float)[order]
+        aligned = np.empty((heights.size, values.shape[1]))
+        for j in range(values.shape[1]):
+            aligned[:, j] = np.interp(heights, h[order], values[:, j],
+                                      left=np.nan, right=np.nan)
+        return pd.DataFrame(aligned, index=heights, columns=df.columns)
+
+    def _variable(self, name):
+        """profile variable, created if missing"""
+        if name not in self._ds.variables:
+            self._ds.createVariable(name, DTYPE, ('time', 'height'),
+                                    zlib=True, fill_value=np.nan)
+        return self._ds.variables[name]
+
+    def append(self, t, df):
+        """Append a height indexed profile DataFrame at time t.
+
+        Returns:
+            bool: False if t was already stored
+        """
+        t = pd.Timestamp(t)
+        if t in self.times:
+            return False
+        if self._ds is None:
+            heights = df.index if self._heights is None else self._heights
+            self._create(np.sort(np.asarray(heights, dtype=float)))
+        df = self._align(df)
+        i = len(self._ds.dimensions['time'])
+        tvar = self._ds.variables['time']
+        tvar[i] = nc.date2num(t.to_pydatetime(), tvar.units)
+        for name in df:
+            self._variable(name)[i, :] = df[name].values
+        self._ds.sync()
+        self.times.add(t)
+        return True
+
+    def close(self):
+        """Close the file."""
+        if self._ds is not None:
+            self._ds.close()
+            self._ds = None
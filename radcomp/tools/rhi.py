@@ -4,6 +4,11 @@
 Authors: Dmitri Moisseev and Jussi Tiira
 """
 
+import time
+import multiprocessing
+from copy import deepcopy
+from functools import partial
+from collections import Counter
 from glob import glob
 from os import path
 from datetime import datetime, timedelta
@@ -11,17 +16,24 @@ from datetime import datetime, timedelta
 import pyart
 import numpy as np
 import pandas as pd
+import xarray as xr
 import scipy.io as sio
 import matplotlib.pyplot as plt
 
-from radcomp.tools import db2lin, lin2db
+from radcomp.tools import db2lin, lin2db, kdp, aggregation, DB_SCALED_VARS
+from radcomp.tools.profile_writer import ProfileWriter
 
 from j24 import eprint
 
 
 R_IKA_HYDE = 64450 # m
 AZIM_IKA_HYDE = 81.89208 # deg
-DB_SCALED_VARS = ('ZH', 'ZDR')
+FILTERED_VARS = ('ZH', 'ZDR', 'KDP', 'RHO')
+RHI_GLOB = '*RHI_HV*.raw'
+N_HBINS = 297
+MANIFEST_COLUMNS = ['file', 'time', 'seconds', 'status', 'error']
+VOLSCAN_INTERVAL = timedelta(minutes=5)
+MAX_AZIMUTH_OFFSET = 1.0 # deg
 
 
 def lin_agg(db, agg_fun=np.nanmean, **kws):
@@ -38,13 +50,6 @@ def calibration(radar, field_name, addition):
     radar.fields.update({field_name: field})
 
 
-def _interp(h_target, h_orig, var, agg_fun=np.nanmedian, **kws):
-    """numpy.interp wrapper with aggregation on axis 1"""
-    fun = agg_fun_chooser(agg_fun, **kws)
-    var_agg = fun(var, axis=1)
-    return np.interp(h_target, h_orig, var_agg)
-
-
 def fix_elevation(radar):
     """Correct elevation for antenna transition."""
     for i in [0, 1]:
@@ -52,14 +57,9 @@ def fix_elevation(radar):
            radar.elevation['data'][i] = 0.0
 
 
-def kdp_csu(radar):
+def kdp_csu(radar, **kws):
     """"CSU kdp and processed phidp to radar object"""
-    from csu_radartools import csu_kdp
-    dz = extract_unmasked_data(radar, 'reflectivity')
-    dp = extract_unmasked_data(radar, 'differential_phase')
-    rng2d, ele2d = np.meshgrid(radar.range['data'], radar.elevation['data'])
-    kd, fd, sd = csu_kdp.calc_kdp_bringi(dp=dp, dz=dz, rng=rng2d/1000.0,
-                                            thsd=12, gs=125.0, window=10)
+    kd, fd = kdp.retrieve(radar, method='csu', **kws)
     radar = add_field_to_radar_object(kd, radar, field_name='kdp_csu', units='deg/km',
                                    long_name='Specific Differential Phase',
                                    standard_name='Specific Differential Phase',
@@ -73,20 +73,24 @@ def kdp_csu(radar):
 
 def kdp_maesaka(radar, **kws):
     """Compute KDP using Maesaka algo from a radar object."""
-    mask = radar.fields['differential_phase']['data'].mask
-    try:
-        kdp_m = pyart.retrieve.kdp_maesaka(radar, **kws)
-    except IndexError:
-        # outlier checking sometimes causes trouble (with weak kdp?)
-        eprint('Skipping outlier check.')
-        kdp_m = pyart.retrieve.kdp_maesaka(radar, check_outliers=False,
-                                           **kws)
-    return np.ma.masked_array(data=kdp_m[0]['data'], mask=mask)
-
-
-def kdp_all(radar):
-    """all kdp processing methods"""
-    radar = kdp_csu(radar)
+    return kdp.retrieve(radar, method='maesaka', **kws)[0]
+
+
+def kdp_all(radar, methods=('csu',), processes=None, **kws):
+    """all kdp processing methods computed in parallel"""
+    results = kdp.retrieve_many(radar, {m: dict() for m in methods},
+                                processes=processes, **kws)
+    for method, (kd, fd) in results.items():
+        add_field_to_radar_object(kd, radar, field_name='kdp_'+method,
+                                  units='deg/km',
+                                  long_name='Specific Differential Phase',
+                                  standard_name='Specific Differential Phase',
+                                  dz_field='reflectivity')
+        if method == 'csu':
+            add_field_to_radar_object(fd, radar, field_name='FDP', units='deg',
+                                      long_name='Filtered Differential Phase',
+                                      standard_name='Filtered Differential Phase',
+                                      dz_field='reflectivity')
     opt = dict(psidp_field='FDP')
     #kdp_m=pyart.retrieve.kdp_maesaka(radar)
     #kdp_s=pyart.retrieve.kdp_schneebeli(radar, **opt)
@@ -98,13 +102,12 @@ def kdp_all(radar):
 
 
 def kdp_retrieval(radar, method='csu', **kws):
-    """wrapper for selecting KDP method"""
-    if method == 'maesaka':
-        return kdp_maesaka(radar, **kws)
-    elif method == 'csu':
-        radar = kdp_csu(radar)
-        return radar.fields['kdp_csu'].copy()['data']
-    raise ValueError('Unknown KDP method.')
+    """wrapper for selecting KDP method
+
+    Retrieval can be limited to a slice of gates and cached per source file,
+    see radcomp.tools.kdp.retrieve.
+    """
+    return kdp.retrieve(radar, method=method, **kws)[0]
 
 
 def extract_radar_vars(radar, recalculate_kdp=True, kdp_debug=False, **kws):
@@ -114,7 +117,8 @@ def extract_radar_vars(radar, recalculate_kdp=True, kdp_debug=False, **kws):
     RHO = radar.fields['cross_correlation_ratio'].copy()['data']
     DP = radar.fields['differential_phase'].copy()['data']
     if kdp_debug:
-        radar = kdp_all(radar)
+        radar = kdp_all(radar, gates=kws.get('gates'),
+                        source=kws.get('source'))
         KDP = radar.fields['kdp_csu'].copy()['data']
     elif recalculate_kdp:
         KDP = kdp_retrieval(radar, **kws)
@@ -131,25 +135,63 @@ def scan_timestamp(radar):
     return t.replace(second=0, microsecond=0).to_datetime64()
 
 
+def range_window(r, r_poi, r_agg):
+    """gate mask of a range window and the slice of gates it spans"""
+    mask = (r > r_poi-r_agg) & (r < r_poi+r_agg)
+    cols = np.flatnonzero(mask.any(axis=0))
+    window = slice(cols[0], cols[-1]+1) if cols.size else slice(0, 0)
+    return mask[:, window], window
+
+
+def agg_fields(rdr_vars, keys, agg_fun=np.nanmedian, **kws):
+    """Aggregate fields along gates, DB_SCALED_VARS in linear space.
+
+    Returns:
+        array: aggregated (field, ray) values
+    """
+    stacked = aggregation.stack(rdr_vars, keys, **kws)
+    return aggregation.aggregate(stacked, keys, stat=agg_fun,
+                                 db_vars=DB_SCALED_VARS)
+
+
 def filter_range(rdr_vars, r, r_poi, r_agg):
     """Discard all data that is not within a range from a distance of interest.
     """
     rvars = rdr_vars.copy()
-    rmin = r_poi - r_agg
-    rmax = r_poi + r_agg
-    for key in ['ZH', 'ZDR', 'KDP', 'RHO']:
-        var = rvars[key]
-        var.set_fill_value(np.nan)
-        var.mask[r<=rmin] = True
-        var.mask[r>=rmax] = True
-        rvars.update({key: var.filled()})
+    in_window = (r > r_poi-r_agg) & (r < r_poi+r_agg)
+    stacked = aggregation.stack(rdr_vars, FILTERED_VARS, mask=in_window,
+                                dtype=float).copy()
+    rvars.update(zip(FILTERED_VARS, stacked))
     return rvars
 
 
+def window_agg(rdr_vars, r, r_poi, r_agg, agg_fun=np.nanmedian):
+    """Aggregate fields along each ray within a range window.
+
+    Only gates spanned by the window are extracted. Fields not in
+    FILTERED_VARS are aggregated over whole rays.
+
+    Returns:
+        list, array: field names and aggregated (field, ray) values
+    """
+    keys = sorted(rdr_vars)
+    out = np.empty((len(keys), r.shape[0]))
+    filtered = [i for i, key in enumerate(keys) if key in FILTERED_VARS]
+    other = [i for i, key in enumerate(keys) if key not in FILTERED_VARS]
+    mask, window = range_window(r, r_poi, r_agg)
+    for ii, kws in ((filtered, dict(mask=mask, window=window)), (other, {})):
+        if not ii:
+            continue
+        subkeys = [keys[i] for i in ii]
+        out[ii] = agg_fields(rdr_vars, subkeys, agg_fun=agg_fun, **kws)
+    return keys, out
+
+
 def height(radar, r, r_poi):
-    dr = np.abs(r-r_poi)
-    ix = dr.argmin(axis=1)
-    return radar.gate_z['data'][range(ix.size),ix]
+    """height of the gate nearest to r_poi on each ray"""
+    ix = np.abs(r-r_poi).argmin(axis=1)
+    return np.take_along_axis(radar.gate_z['data'], ix[:, np.newaxis],
+                              axis=1)[:, 0]
 
 
 def plot_compare_kdp(vrhi):
@@ -166,8 +208,32 @@ def plot_compare_kdp(vrhi):
 
 def agg2vp(hght, rdr_vars, agg_fun=np.nanmedian):
     """Aggregate along r axis to a vertical profile."""
-    # TODO: Panel
-    df = pd.Panel(major_axis=hght, data=rdr_vars).apply(np.nanmedian, axis=2)
+    keys = sorted(rdr_vars)
+    agg = agg_fields(rdr_vars, keys, agg_fun=agg_fun)
+    df = pd.DataFrame(agg.T, index=hght, columns=keys)
+    df.index.name = 'height'
+    return df
+
+
+def window_vp(radar, r_poi=R_IKA_HYDE, r_agg=1e3, agg_fun=np.nanmedian,
+              **kws):
+    """Extract and aggregate fields within a range window to a profile.
+
+    Returns:
+        DataFrame: aggregated fields indexed by ray height, None on failure
+    """
+    try: # extracting variables
+        # before gate_x is first computed and cached
+        fix_elevation(radar)
+        r = radar.gate_x['data'] # horizontal range
+        # gates needed for phase processing around the window
+        _, gates = range_window(r, r_poi, r_agg+kdp.MARGIN)
+        rdr_vars = extract_radar_vars(radar, gates=gates, **kws)
+    except Exception as e:
+        eprint('[extract error] {e}'.format(e=e))
+        return None
+    keys, agg = window_agg(rdr_vars, r, r_poi, r_agg, agg_fun=agg_fun)
+    df = pd.DataFrame(agg.T, index=height(radar, r, r_poi), columns=keys)
     df.index.name = 'height'
     return df
 
@@ -176,9 +242,9 @@ def vrhi2vp(radar, h_thresh=60, Clpf=5000, use_hyy_h=False, **kws):
     """Extract vertical profile from volume scan slice."""
     #plot_compare_kdp(radar)
     calib_all(radar)
-    rdr_vars, hght = rhi_preprocess(radar, Clpf=Clpf, **kws)
-    df = agg2vp(hght, rdr_vars)
-    df.index.name = 'height'
+    df = window_vp(radar, Clpf=Clpf, **kws)
+    if df is None:
+        return None, None
     if use_hyy_h:
         h = np.array([580, 1010, 1950, 3650, 5950, 10550])
         h_norm = np.linalg.norm(df.index.values-h)
@@ -190,17 +256,15 @@ def vrhi2vp(radar, h_thresh=60, Clpf=5000, use_hyy_h=False, **kws):
 
 
 def rhi2vp(radar, n_hbins=None, hbins=None, agg_fun=np.nanmedian, **kws):
-    hbins = hbins or np.linspace(200, 15000, n_hbins)
     """Extract vertical profile from RHI."""
+    if hbins is None:
+        hbins = np.linspace(200, 15000, n_hbins)
     calib_all(radar)
-    rdr_vars, hght = rhi_preprocess(radar, **kws)
-    if hght is None:
+    vp = window_vp(radar, agg_fun=agg_fun, **kws)
+    if vp is None:
         return None, None
-    rvars = dict()
-    for key in rdr_vars.keys():
-        db_scale = key in DB_SCALED_VARS
-        rvars[key] = _interp(hbins, hght, rdr_vars[key], agg_fun,
-                             db_scale=db_scale)
+    hght = vp.index.values
+    rvars = {key: np.interp(hbins, hght, vp[key].values) for key in vp}
     df = pd.DataFrame(index=hbins, data=rvars)
     return scan_timestamp(radar), df
 
@@ -224,22 +288,233 @@ def rhi_preprocess(radar, r_poi=R_IKA_HYDE, r_agg=1e3, **kws):
     return rvars, hght
 
 
-def agg_fun_chooser(agg_fun, db_scale=False):
-    """aggregation of db-scale variables"""
-    if (agg_fun == np.nanmedian) or not db_scale:
-        return agg_fun
-    return lambda x: lin_agg(x, agg_fun=agg_fun)
+def read_sweeps(files, processes=None):
+    """Read radar data files, optionally using a process pool."""
+    if processes is None or processes < 2:
+        return [pyart.io.read(f) for f in files]
+    with multiprocessing.Pool(processes) as pool:
+        return pool.map(pyart.io.read, files)
 
 
-def create_volume_scan(files):
+def _concat_ray_dicts(dicts, offsets=None):
+    """Concatenate data of ray or sweep metadata dicts."""
+    if any(d is None for d in dicts):
+        return dicts[0]
+    out = dicts[0].copy()
+    if offsets is None:
+        out['data'] = np.concatenate([d['data'] for d in dicts])
+    else:
+        out['data'] = np.concatenate([d['data']+offset for d, offset
+                                      in zip(dicts, offsets)])
+    return out
+
+
+def _concat_instrument_parameters(radars):
+    """Concatenate per ray instrument parameters."""
+    params = radars[0].instrument_parameters
+    if params is None:
+        return None
+    out = dict()
+    for key, meta in params.items():
+        try:
+            dicts = [r.instrument_parameters[key] for r in radars]
+            per_ray = all(d['data'].shape[0] == r.nrays for d, r
+                          in zip(dicts, radars))
+        except (KeyError, IndexError, TypeError):
+            per_ray = False
+        out[key] = _concat_ray_dicts(dicts) if per_ray else meta
+    return out
+
+
+def join_radars(radars):
+    """Join sweeps of radar objects into one volume.
+
+    Ray metadata and fields are allocated once and filled radar by radar.
+    All radars are assumed to share location and gate spacing.
+    """
+    first = radars[0]
+    fields = first.fields
+    first.fields = dict()
+    try:
+        vol = deepcopy(first)
+    finally:
+        first.fields = fields
+    nrays = np.array([r.nrays for r in radars])
+    ray_offsets = np.concatenate(([0], nrays.cumsum()[:-1]))
+    t_start = [pd.to_datetime(r.time['units'].split(' ')[-1]) for r in radars]
+    t_offsets = [(t-t_start[0]).total_seconds() for t in t_start]
+    vol.time = _concat_ray_dicts([r.time for r in radars], offsets=t_offsets)
+    for attr in ('azimuth', 'elevation', 'scan_rate', 'antenna_transition',
+                 'fixed_angle', 'sweep_mode', 'target_scan_rate',
+                 'rays_are_indexed', 'ray_angle_res'):
+        setattr(vol, attr, _concat_ray_dicts([getattr(r, attr) for r
+                                              in radars]))
+    for attr in ('sweep_start_ray_index', 'sweep_end_ray_index'):
+        setattr(vol, attr, _concat_ray_dicts([getattr(r, attr) for r
+                                              in radars], offsets=ray_offsets))
+    vol.instrument_parameters = _concat_instrument_parameters(radars)
+    vol.nsweeps = sum(r.nsweeps for r in radars)
+    vol.sweep_number = first.sweep_number.copy()
+    vol.sweep_number['data'] = np.arange(vol.nsweeps, dtype=np.int32)
+    widest = radars[np.argmax([r.ngates for r in radars])]
+    vol.range = deepcopy(widest.range)
+    vol.nrays = nrays.sum()
+    vol.ngates = widest.ngates
+    vol.fields = dict()
+    for r in radars:
+        for name, field in r.fields.items():
+            if name in vol.fields:
+                continue
+            meta = {k: v for k, v in field.items() if k != 'data'}
+            meta['data'] = np.ma.masked_all((vol.nrays, vol.ngates),
+                                            dtype=field['data'].dtype)
+            vol.fields[name] = meta
+    for r, i0 in zip(radars, ray_offsets):
+        for name, field in r.fields.items():
+            vol.fields[name]['data'][i0:i0+r.nrays, :r.ngates] = field['data']
+    vol.init_rays_per_sweep()
+    vol.init_gate_x_y_z()
+    vol.init_gate_longitude_latitude()
+    vol.init_gate_altitude()
+    return vol
+
+
+def create_volume_scan(files, processes=None):
     """volume scan from multiple radar data files"""
-    r = None
-    for f in files:
-        if r is None:
-            r = pyart.io.read(f)
-            continue
-        r = pyart.util.join_radar(r, pyart.io.read(f))
-    return r
+    return join_radars(read_sweeps(files, processes=processes))
+
+
+def nearest_rays(radar, azimuths, max_offset=MAX_AZIMUTH_OFFSET):
+    """indices of rays nearest to each azimuth in each sweep
+
+    Args:
+        radar (Radar): volume scan
+        azimuths (array): azimuths in degrees
+        max_offset (float, optional): largest accepted azimuth difference in
+            degrees, rays further off are masked
+
+    Returns:
+        MaskedArray: ray indices of shape (sweep, azimuth)
+    """
+    az = radar.azimuth['data']
+    azimuths = np.asarray(azimuths, dtype=float)
+    rays = []
+    offsets = []
+    for i0, i1 in zip(radar.sweep_start_ray_index['data'],
+                      radar.sweep_end_ray_index['data']):
+        diff = np.abs((az[i0:i1+1, np.newaxis]-azimuths+180) % 360 - 180)
+        rays.append(diff.argmin(axis=0)+i0)
+        offsets.append(diff.min(axis=0))
+    rays = np.ma.masked_array(rays, dtype=int)
+    if max_offset is not None:
+        rays[np.array(offsets) > max_offset] = np.ma.masked
+    return rays
+
+
+def target_gates(radar, rays, ranges, r_agg):
+    """gate windows around horizontal distances on each ray
+
+    Horizontal distance is assumed to increase along each ray. The rays are
+    concatenated with a separating offset, so that all windows are found
+    with single searchsorted calls.
+
+    Args:
+        radar (Radar): volume scan
+        rays (array): ray indices of shape (sweep, azimuth)
+        ranges (array): horizontal distances in meters
+        r_agg (float): half width of the windows in meters
+
+    Returns:
+        gates (array): gate indices of shape (sweep, azimuth, range, n)
+        valid (array): boolean mask of gates within the windows
+        igate (array): gate nearest to each distance, (sweep, azimuth, range)
+    """
+    rays = np.ma.getdata(rays)
+    ranges = np.asarray(ranges, dtype=float)
+    hdist = np.hypot(radar.gate_x['data'][rays], radar.gate_y['data'][rays])
+    ngates = hdist.shape[-1]
+    span = hdist.max() + np.abs(ranges).max() + r_agg + 1
+    ray_offset = span*np.arange(rays.size).reshape(rays.shape+(1,))
+    flat = (hdist+ray_offset).ravel()
+    first = ngates*np.arange(rays.size).reshape(rays.shape+(1,))
+    lo = np.searchsorted(flat, ray_offset+ranges-r_agg, side='right')-first
+    hi = np.searchsorted(flat, ray_offset+ranges+r_agg, side='left')-first
+    # nearest of the gates on both sides of each distance
+    right = np.searchsorted(flat, ray_offset+ranges, side='left')-first
+    right = np.clip(right, 1, ngates-1)
+    left = right-1
+    h_left = np.take_along_axis(hdist, left, axis=-1)
+    h_right = np.take_along_axis(hdist, right, axis=-1)
+    igate = np.where(ranges-h_left <= h_right-ranges, left, right)
+    n = max((hi-lo).max(), 1)
+    offset = np.arange(n)
+    gates = np.minimum(lo[..., np.newaxis]+offset, radar.ngates-1)
+    valid = offset < (hi-lo)[..., np.newaxis]
+    return gates, valid, igate
+
+
+def volume_profiles(radar, azimuths, ranges, r_agg=1e3,
+                    fields=('ZH', 'ZDR', 'KDP', 'RHO'), agg_fun=np.nanmedian,
+                    calibrate=True, max_offset=MAX_AZIMUTH_OFFSET, **kws):
+    """Extract vertical profiles at azimuth and range grid from a volume scan.
+
+    For each sweep the ray nearest to each azimuth is used. Gates within
+    r_agg of each horizontal distance are aggregated, and the profile height
+    is taken at the gate nearest to the distance. Profiles of sweeps with no
+    ray within max_offset of an azimuth are nan.
+
+    Args:
+        radar (Radar): volume scan
+        azimuths (array): azimuths in degrees
+        ranges (array): horizontal distances in meters
+        r_agg (float): half width of the aggregation window in meters
+        fields (iterable): extracted variables
+        agg_fun (function): aggregation along range taking axis argument
+        calibrate (bool): apply calib_all to the volume in place
+        max_offset (float, optional): passed to nearest_rays
+        **kws: passed to extract_radar_vars
+
+    Returns:
+        Dataset: variables with dimensions (time, azimuth, range, sweep) and
+            profile heights as a (azimuth, range, sweep) coordinate
+    """
+    if calibrate:
+        calib_all(radar)
+    azimuths = np.asarray(azimuths, dtype=float)
+    ranges = np.asarray(ranges, dtype=float)
+    # gates needed for phase processing around all windows
+    r_all = np.hypot(radar.gate_x['data'], radar.gate_y['data'])
+    r_mid = (ranges.max()+ranges.min())/2
+    r_half = (ranges.max()-ranges.min())/2 + r_agg + kdp.MARGIN
+    _, window = range_window(r_all, r_mid, r_half)
+    rdr_vars = extract_radar_vars(radar, gates=window, **kws)
+    rays = nearest_rays(radar, azimuths, max_offset=max_offset)
+    missing = np.ma.getmaskarray(rays) # (sweep, azimuth)
+    rays = np.ma.getdata(rays)
+    gates, valid, igate = target_gates(radar, rays, ranges, r_agg)
+    iray = rays[:, :, np.newaxis, np.newaxis]
+    fields = list(fields)
+    # (field, sweep, azimuth, range, gate) values within the windows
+    windowed = np.full((len(fields),)+gates.shape, np.nan,
+                       dtype=aggregation.DTYPE)
+    for i, key in enumerate(fields):
+        var = rdr_vars[key][iray, gates]
+        ok = valid & ~np.ma.getmaskarray(var)
+        np.copyto(windowed[i], np.ma.getdata(var), where=ok, casting='unsafe')
+    agg = aggregation.aggregate(windowed, fields, stat=agg_fun,
+                                db_vars=DB_SCALED_VARS)
+    agg[:, missing] = np.nan
+    hght = radar.gate_z['data'][rays[..., np.newaxis], igate].astype(float)
+    hght[missing] = np.nan
+    dims = ('time', 'azimuth', 'range', 'sweep')
+    sweeps = np.arange(rays.shape[0])
+    coords = dict(time=[scan_timestamp(radar)], azimuth=azimuths,
+                  range=ranges, sweep=sweeps)
+    coords['height'] = (dims[1:], hght.transpose(1, 2, 0))
+    coords['elevation'] = ('sweep', radar.fixed_angle['data'][sweeps])
+    data_vars = {key: (dims, agg_field.transpose(1, 2, 0)[np.newaxis])
+                 for key, agg_field in zip(fields, agg)}
+    return xr.Dataset(data_vars, coords=coords)
 
 
 def volscan_groups(dir_in):
@@ -249,25 +524,47 @@ def volscan_groups(dir_in):
     return fnames.groupby(tstrs)
 
 
-def xarray_workflow(dir_in, dir_out=None, **kws):
-    """Extract profiles from volume scans as xarray Dataset."""
+def xarray_workflow(dir_in, dir_out=None, processes=None, overwrite=False,
+                    **kws):
+    """Extract profiles from volume scans as xarray Dataset.
+
+    With dir_out, profiles are appended to daily nc files as they are
+    extracted, and scans already in the files are skipped.
+    """
     g = volscan_groups(dir_in)
     vps = dict()
-    for tstr, df in g:
-        print(tstr)
-        df.sort_values(inplace=True)
-        vs = create_volume_scan(df)
-        vrhi = pyart.util.cross_section_ppi(vs, [AZIM_IKA_HYDE])
-        t, vp = vrhi2vp(vrhi, **kws)
-        vps[t] = vp
+    writers = dict()
+    try:
+        for tstr, df in g:
+            t = pd.to_datetime(tstr, format='%Y%m%d%H%M')
+            fname = t.strftime('%Y%m%d_IKA_vpvol.nc')
+            if dir_out is not None and fname not in writers:
+                writers[fname] = ProfileWriter(path.join(dir_out, fname),
+                                               overwrite=overwrite)
+            writer = writers.get(fname)
+            if writer is not None and writer.covers(t, t+VOLSCAN_INTERVAL):
+                continue
+            print(tstr)
+            df.sort_values(inplace=True)
+            vs = create_volume_scan(df, processes=processes)
+            vrhi = pyart.util.cross_section_ppi(vs, [AZIM_IKA_HYDE])
+            ts, vp = vrhi2vp(vrhi, **kws)
+            if ts is None:
+                continue
+            if writer is None:
+                vps[ts] = vp
+                continue
+            writer.append(ts, vp)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    if dir_out is not None:
+        files = [path.join(dir_out, fname) for fname in sorted(writers)]
+        dss = [load_nc(f) for f in files if path.exists(f)]
+        return xr.concat(dss, dim='time').sortby('time')
     df = pd.concat(vps)
     df.index.rename(['time', 'height'], inplace=True)
-    ds = df.to_xarray()
-    if dir_out is not None:
-        t = ds.time.values[0]
-        fname = pd.to_datetime(t).strftime('%Y%m%d_IKA_vpvol.nc')
-        ds.to_netcdf(path.join(dir_out, fname))
-    return ds
+    return df.to_xarray()
 
 
 def xarray_ppi():
@@ -308,29 +605,125 @@ def mat_workflow(dir_in, dir_out, fname_supl='IKA_vprhi', overwrite=False,
 def nc_workflow(dir_in, dir_out, fname_supl='IKA_vprhi', overwrite=False,
                  **kws):
     """Extract profiles and save as nc."""
-    n_hbins = 297
-    files = np.sort(glob(path.join(dir_in, "*RHI_HV*.raw")))
-    time_filename = path.basename(files[0])[0:8]
-    fileOut = path.join(dir_out, time_filename + '_' + fname_supl + '.nc')
-    vps = dict()
-    if path.exists(fileOut) and not overwrite:
-        print('{} [notice] file already exists, skipping.'.format(fileOut))
-        return
-    for file_indx, filename in enumerate(files):
-        print(filename)
-        try: # reading radar data
-            radar = pyart.io.read(filename)
-        except Exception as e:
-            eprint('{fname} [read error] {e}'.format(fname=filename, e=e))
-            continue
-        ts, df = rhi2vp(radar, n_hbins=n_hbins, **kws)
-        vps[ts] = df
-    df = pd.concat(vps)
-    df.index.rename(['time', 'height'], inplace=True)
-    ds = df.to_xarray()
-    if dir_out is not None:
-        ds.to_netcdf(fileOut)
-    return ds
+    files = np.sort(glob(path.join(dir_in, RHI_GLOB)))
+    batch_extract(files, dir_out, fname_supl=fname_supl, overwrite=overwrite,
+                  **kws)
+    fileOut = daily_path(dir_out, file_day(files[0]), fname_supl)
+    if path.exists(fileOut):
+        return load_nc(fileOut).sortby('time')
+
+
+def load_nc(filepath):
+    """Load a dataset to memory and close the file."""
+    with xr.open_dataset(filepath) as ds:
+        return ds.load()
+
+
+def file_day(filename):
+    """date string of a radar data file"""
+    return path.basename(filename)[0:8]
+
+
+def daily_path(dir_out, day, fname_supl):
+    """path of daily profile output"""
+    return path.join(dir_out, day + '_' + fname_supl + '.nc')
+
+
+def manifest_path(dir_out, fname_supl):
+    """path of batch extraction manifest"""
+    return path.join(dir_out, fname_supl + '_manifest.csv')
+
+
+def read_manifest(filepath):
+    """batch extraction manifest indexed by file basename
+
+    Only the latest entry of each file is kept.
+    """
+    if path.exists(filepath):
+        manifest = pd.read_csv(filepath, index_col='file')
+        return manifest[~manifest.index.duplicated(keep='last')]
+    return pd.DataFrame(columns=MANIFEST_COLUMNS).set_index('file')
+
+
+def append_manifest(row, filepath):
+    """Append a file entry to the manifest csv."""
+    df = pd.DataFrame([row], columns=MANIFEST_COLUMNS)
+    df.to_csv(filepath, mode='a', index=False,
+              header=not path.exists(filepath))
+
+
+def extract_file(filename, n_hbins=N_HBINS, **kws):
+    """Extract vertical profile from an RHI file.
+
+    Returns:
+        filename, timestamp, profile DataFrame, seconds spent, error message
+        and KDP computing times recorded during the extraction
+    """
+    t0 = time.time()
+    ts, df, err = None, None, None
+    try:
+        radar = pyart.io.read(filename)
+        ts, df = rhi2vp(radar, n_hbins=n_hbins, source=filename, **kws)
+        if ts is None:
+            err = 'extraction failed'
+    except Exception as e:
+        err = '{}: {}'.format(type(e).__name__, e)
+    return filename, ts, df, time.time()-t0, err, kdp.pop_timings()
+
+
+def batch_extract(files, dir_out, fname_supl='IKA_vprhi', overwrite=False,
+                  processes=None, **kws):
+    """Extract profiles from RHI files in parallel to daily nc files.
+
+    Files listed as processed in the manifest of dir_out are skipped unless
+    overwrite is True. Profiles are appended to daily nc files as they are
+    extracted, and an entry is appended to the manifest after each file, so
+    that an interrupted run can be resumed.
+
+    Args:
+        files (list): RHI file paths
+        dir_out (str): output directory
+        fname_supl (str): output file name suffix
+        overwrite (bool): reprocess all files and replace outputs
+        processes (int, optional): number of worker processes
+        **kws: passed to rhi2vp
+
+    Returns:
+        DataFrame: manifest with per file timings and errors
+    """
+    manifest_file = manifest_path(dir_out, fname_supl)
+    manifest = read_manifest(manifest_file)
+    done = manifest.index[manifest.status == 'ok']
+    todo = [f for f in files if overwrite or path.basename(f) not in done]
+    pending = Counter(file_day(f) for f in todo)
+    writers = dict()
+    extract = partial(extract_file, **kws)
+    try:
+        with multiprocessing.Pool(processes) as pool:
+            for result in pool.imap_unordered(extract, todo):
+                filename, ts, df, seconds, err, timings = result
+                kdp.merge_timings(timings)
+                day = file_day(filename)
+                if day not in writers:
+                    daily = daily_path(dir_out, day, fname_supl)
+                    writers[day] = ProfileWriter(daily, overwrite=overwrite)
+                if err is None:
+                    writers[day].append(ts, df)
+                status = 'ok' if err is None else 'error'
+                if err is None:
+                    print('{} {:.1f} s'.format(filename, seconds))
+                else:
+                    eprint('{} [error] {}'.format(filename, err))
+                row = dict(file=path.basename(filename), time=ts,
+                           seconds=seconds, status=status, error=err)
+                append_manifest(row, manifest_file)
+                pending[day] -= 1
+                if pending[day] == 0:
+                    writers.pop(day).close()
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return read_manifest(manifest_file)
 
 
 def add_field_to_radar_object(field, radar, field_name='FH', units='unitless',
@@ -26,6 +26,7 @@ else:
     DATA_DIR = path.join(home(), 'DATA', 'vprhi2')
     DATA_FILE_FMT = '%Y%m%d_IKA_vprhi.mat'
 DEFAULT_PARAMS = ['zh', 'zdr', 'kdp']
+PLOT_EXTRAS = ('ts', 'silh', 'cl', 'lwe')
 
 
 def case_id_fmt(t_start, t_end=None, dtformat='{year}{month}{day}{hour}',
@@ -185,9 +186,12 @@ def inversion_score(c):
 
 def plot_case(c, params=None, interactive=True, raw=True, n_extra_ax=0,
              t_contour_ax_ind=False, above_ml_only=False, t_levels=[0],
-             inverse_transformed=False, plot_extras=['ts', 'silh', 'cl', 'lwe'],
-             **kws):
-    """Visualize a Case object."""
+             inverse_transformed=False, plot_extras=PLOT_EXTRAS,
+             headless=False, **kws):
+    """Visualize a Case object.
+
+    In headless mode no cursor or event handlers are attached to the figure.
+    """
     try:
         c.load_model_temperature()
     except (ValueError, FileNotFoundError):
@@ -257,9 +261,10 @@ def plot_case(c, params=None, interactive=True, raw=True, n_extra_ax=0,
     if c.has_ml and has_vpc and not above_ml_only:
         for i in range(len(params)):
             c.plot_ml(ax=axarr[i])
-    c.cursor = mpl.widgets.MultiCursor(fig.canvas, axarr, color='black',
-                                       horizOn=True, vertOn=True, lw=0.5)
-    if interactive:
+    if not headless:
+        c.cursor = mpl.widgets.MultiCursor(fig.canvas, axarr, color='black',
+                                           horizOn=True, vertOn=True, lw=0.5)
+    if interactive and not headless:
         on_click_fun = lambda event: c._on_click_plot_dt_cs(event, params=params,
                                                             inverse_transformed=inverse_transformed,
                                                             above_ml_only=above_ml_only)
@@ -301,6 +306,7 @@ class Case:
         self._dt_ax = None
         self.cursor = None
         self._classes = None
+        self._ml_limits = None
 
     @classmethod
     def from_dtrange(cls, t0, t1, **kws):
@@ -329,9 +335,10 @@ class Case:
 
     @classmethod
     def from_nc(cls, ncfile, **kws):
-        #y u no work?
-        ds = xr.open_dataset(ncfile)
-        return cls.from_xarray(ds **kws)
+        """Case from a profile nc file"""
+        with xr.open_dataset(ncfile) as ds:
+            ds = ds.sortby('time').load()
+        return cls.from_xarray(ds, **kws)
 
     @property
     def data_above_ml(self):
@@ -373,17 +380,21 @@ class Case:
         """date range based id"""
         return case_id_fmt(self.t_start(), self.t_end(), **kws)
 
+    def time_index(self):
+        """data time axis"""
+        return self.data.minor_axis
+
     def t_start(self):
         """data start time"""
-        return self.data.minor_axis[0]
+        return self.time_index()[0]
 
     def t_end(self):
         """data end time"""
-        return self.data.minor_axis[-1]
+        return self.time_index()[-1]
 
     def timestamps(self, fill_value=None, round_index=False):
         """Data timestamps as Series. Optionally filled with fill_value."""
-        t = self.data.minor_axis
+        t = self.time_index()
         data = t if fill_value is None else np.full(t.size, fill_value)
         ts = pd.Series(index=t, data=data)
         if round_index:
@@ -438,9 +449,11 @@ class Case:
         if self.vpc is None:
             nans = self.timestamps(fill_value=np.nan)
             return nans.copy(), nans.copy()
-        if 'MLI' not in self.data:
-            self.prepare_mli(save=True)
-        bot, top = ml.ml_limits(self.data['MLI'], self.data['RHO'])
+        if self._ml_limits is None:
+            if 'MLI' not in self.data:
+                self.prepare_mli(save=True)
+            self._ml_limits = ml.ml_limits(self.data['MLI'], self.data['RHO'])
+        bot, top = (lim.copy() for lim in self._ml_limits)
         if not interpolate:
             return bot, top
         return tuple(lim.interpolate().bfill().ffill() for lim in (bot, top))
@@ -472,7 +485,7 @@ class Case:
             classes, silh = self.vpc.classify(self.cl_data_scaled, **classify_kws)
             classes.name = 'class'
             if save:
-                self.silh_score = silh.reindex(self.data.minor_axis)
+                self.silh_score = silh.reindex(self.time_index())
                 self._classes = classes
             return classes, silh
         return None, None
@@ -521,6 +534,19 @@ class Case:
         self.set_xlim(ax)
         return ax
 
+    def extras(self, plot_extras=PLOT_EXTRAS):
+        """extra time series plotted with plot_extras"""
+        series = OrderedDict()
+        if 'ts' in plot_extras:
+            series['ts'] = self.t_surface()
+        if ('lwe' in plot_extras) and (self.pluvio is not None):
+            series['lwe'] = self.lwe()
+        if 'azs' in plot_extras:
+            series['azs'] = self.azs()
+        if 'fr' in plot_extras:
+            series['fr'] = self.fr()
+        return series
+
     def plot_t(self, ax, tmin=-25, tmax=10):
         """Plot surface temperature."""
         self.plot_series(self.t_surface(), ax=ax)
@@ -622,7 +648,7 @@ class Case:
     def base_minute(self):
         """positive offset in minutes for profile measurements after each hour
         """
-        return self.data.minor_axis[0].round('1min').minute%15
+        return self.t_start().round('1min').minute%15
 
     def base_middle(self):
         dt_minutes = round(self.timedelta.total_seconds()/60)
@@ -646,21 +672,21 @@ class Case:
         """
         t_end = self.t_end()+pd.Timedelta(minutes=15)
         if use_arm:
-            t = arm.var_in_timerange(self.t_start(), t_end, var='temp_mean')
+            tre = arm.resampled_vars(self.t_start(), t_end,
+                                     variables=['temp_mean'],
+                                     base=self.base_minute())['temp_mean']
         else:
-            hdfpath = path.join(home(), 'DATA', 't_fmi_14-17.h5')
-            if not path.exists(hdfpath):
+            if not insitu.T_FMI.exists():
                 return pd.Series()
-            t = pd.read_hdf(hdfpath, 'data')['TC'][self.t_start():t_end]
-            t.name = 'temp_mean'
-        tre = t.resample('15min', base=self.base_minute()).mean()
+            tre = insitu.T_FMI.resampled(self.t_start(), t_end,
+                                         base=self.base_minute())
         if interp_gaps:
             tre = tre.interpolate()
         return tre
 
     def azs(self, **kws):
         t_end = self.t_end()+pd.Timedelta(minutes=15)
-        data = azs.load_series()[self.t_start(): t_end]
+        data = azs.range_series(self.t_start(), t_end, **kws)
         if data.empty:
             return pd.Series()
         return data.resample('15min', base=self.base_minute()).mean()
@@ -694,47 +720,43 @@ class Case:
     def fr(self):
         """rime mass fraction"""
         t_end = self.t_end()+pd.Timedelta(minutes=15)
-        hdfpath = path.join(home(), 'DATA', 'FR_haoran.h5')
-        if not path.exists(hdfpath):
+        if not insitu.FR.exists():
             return pd.Series()
-        fr = pd.read_hdf(hdfpath, 'data')[self.t_start():t_end]
-        return self.time_weighted_mean(fr, offset_half_delta=False)
+        kws = dict(rule=self.timedelta, base=self.base_minute(), offset=0)
+        return insitu.FR.resampled(self.t_start(), t_end,
+                                   fun=insitu.time_weighted_mean, **kws)
 
     def lwp(self):
         """liquid water path"""
         t_end = self.t_end()+pd.Timedelta(minutes=15)
-        lwp = arm.var_in_timerange(self.t_start(), t_end, var='liq',
-                                   globfmt=arm.MWR_GLOB)
-        return lwp.resample('15min', base=self.base_minute()).mean()
+        lwp = arm.resampled_vars(self.t_start(), t_end, variables=['liq'],
+                                 globfmt=arm.MWR_GLOB, base=self.base_minute())
+        return lwp['liq']
 
-    def snd(self, var='TEMP'):
-        """interpolated sounding profile data"""
+    def snd(self, var=None, engine=None):
+        """interpolated sounding profile data
+
+        Args:
+            var (str, optional): sounding variable, 'TEMP' or that of engine
+                by default
+            engine (sounding.SoundingProfiles, optional): shared sounding
+                interpolator, e.g. when processing many cases
+
+        Returns:
+            DataFrame: sounding data on the height grid of the case
+        """
         from radcomp import sounding
-        ts = self.timestamps().apply(sounding.round_hours, hres=12).drop_duplicates()
-        ts.index = ts.values
-        if ts.iloc[0] > self.t_start():
-            t0 = ts.iloc[0]-timedelta(hours=12)
-            ts[t0] = t0
-            ts.sort_index(inplace=True)
-        if ts.iloc[-1] < self.t_end():
-            t1 = ts.iloc[-1]+timedelta(hours=12)
-            ts[t1] = t1
-            ts.sort_index(inplace=True)
-        def snd_col(x):
-            try:
-                return sounding.read_sounding(x, index_col='HGHT')[var]
-            except pd.errors.ParserError:
-                return pd.Series(index=(0, 20000), data=(np.nan, np.nan))
-        a = ts.apply(snd_col)
-        a.interpolate(axis=1, inplace=True)
-        na = self.timestamps().apply(lambda x: np.nan)
-        na = pd.DataFrame(na).reindex(a.columns, axis=1)
-        t = pd.concat([na, a]).sort_index().interpolate(method='time')
+        if engine is None:
+            engine = sounding.SoundingProfiles(self.data.major_axis,
+                                               var=var or 'TEMP')
+        elif var is not None and var != engine.var:
+            efmt = 'Requested variable {} but engine interpolates {}.'
+            raise ValueError(efmt.format(var, engine.var))
         if self.vpc is not None:
             hmax = self.vpc.hlimits[1]
         else:
             hmax = self.data.major_axis.max()
-        return t.loc[:, 0:hmax].drop(a.index).T
+        return engine.to_df(self.data.minor_axis).loc[:hmax]
 
     def echotop(self):
         """echo top heights"""
@@ -742,14 +764,7 @@ class Case:
 
     def t_echotop(self, fill=True):
         """model temperature at echo top"""
-        t = self.data['T']
-        top = self.echotop()
-        if fill:
-            top.fillna(self.data.major_axis[0], inplace=True)
-        d = {}
-        for dt, h in top.iteritems():
-            d[dt] = np.nan if np.isnan(h) else t.loc[h, dt]
-        return pd.Series(d, name='t_top')
+        return deriv.t_echotop(self.data['zh'], self.data['T'], fill=fill)
 
     def classes(self):
         """classification results"""
@@ -758,6 +773,6 @@ class Case:
         if self.vpc is None:
             raise RuntimeError('No classification scheme configured.')
         try:
-            return self.vpc.classes.loc[self.data.minor_axis].copy()
+            return self.vpc.classes.loc[self.time_index()].copy()
         except KeyError:
             return None
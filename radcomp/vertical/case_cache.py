@@ -0,0 +1,175 @@
+# coding: utf-8
+"""classification results of case collections in the result cache
+
+Cached results are keyed by the content of the case list, the classification
+scheme and preprocessing parameters. Each case is stored as a compressed npz
+file of its data cube, classes, silhouette scores and ML limits.
+"""
+
+import hashlib
+from os import path
+
+import numpy as np
+import pandas as pd
+
+from radcomp import cache
+from radcomp.vertical import case, classification, multicase
+
+
+CASES_FILE = 'cases.csv'
+COMBINED_FILE = '_combined.npz'
+TRISTATE = {-1: None, 0: False, 1: True}
+
+
+def case_list_hash(cases_id):
+    """md5 hash of the content of a case list"""
+    dts = multicase.read_case_times(cases_id)
+    return hashlib.md5(dts.to_csv().encode()).hexdigest()
+
+
+def cache_key(cases_id, scheme_id, **params):
+    """result cache key of a case list classified using a scheme"""
+    return cache.hash_key(case_list_hash(cases_id), scheme_id, **params)
+
+
+def tristate_code(flag):
+    """-1, 0 or 1 for unknown (None or nan), False or True"""
+    if flag is None or pd.isnull(flag):
+        return -1
+    return int(bool(flag))
+
+
+def case_arrays(c):
+    """dict of arrays describing a classified case"""
+    data = c.data
+    arrays = dict(values=data.values, items=np.array(data.items, dtype=str),
+                  heights=data.major_axis.values,
+                  times=data.minor_axis.values, has_ml=c.has_ml,
+                  multi=isinstance(c, multicase.MultiCase))
+    if arrays['multi']:
+        if c.convective is not None:
+            arrays['convective'] = c.convective.values.astype(float)
+    else:
+        arrays['is_convective'] = tristate_code(c.is_convective)
+    if c.vpc is None:
+        return arrays
+    classes = c.classes()
+    if classes is not None:
+        arrays['classes'] = classes.values
+        arrays['class_times'] = classes.index.values
+    if c.silh_score is not None:
+        arrays['silh'] = c.silh_score.values
+    if c.has_ml:
+        bot, top = c.ml_limits(interpolate=False)
+        arrays['ml_bot'] = bot.values
+        arrays['ml_top'] = top.values
+        arrays['ml_times'] = bot.index.values
+    return arrays
+
+
+def save_case(c, filepath):
+    """Save classified case as compressed npz."""
+    np.savez_compressed(filepath, **case_arrays(c))
+
+
+def load_case(filepath, vpc=None):
+    """Load a case saved with save_case.
+
+    Args:
+        filepath (str): npz file path
+        vpc (VPC, optional): classification scheme of the case
+
+    Returns:
+        Case or MultiCase
+    """
+    with np.load(filepath, allow_pickle=False) as f:
+        data = pd.Panel(f['values'], items=f['items'],
+                        major_axis=f['heights'], minor_axis=f['times'])
+        kws = dict(data=data, has_ml=bool(f['has_ml']), vpc=vpc)
+        if f['multi']:
+            c = multicase.MultiCase(**kws)
+            if 'convective' in f:
+                c.convective = pd.Series(f['convective'],
+                                         index=data.minor_axis)
+        elif 'is_convective' in f:
+            is_convective = TRISTATE[int(f['is_convective'])]
+            c = case.Case(is_convective=is_convective, **kws)
+        else:
+            c = case.Case(**kws)
+        if 'classes' in f:
+            c._classes = pd.Series(f['classes'], index=f['class_times'],
+                                   name='class')
+        if 'silh' in f:
+            c.silh_score = pd.Series(f['silh'], index=c.time_index())
+        if 'ml_bot' in f:
+            c._ml_limits = tuple(pd.Series(f[key], index=f['ml_times'])
+                                 for key in ('ml_bot', 'ml_top'))
+    return c
+
+
+def case_fname(i):
+    """npz file name of ith case"""
+    return 'case{:04d}.npz'.format(i)
+
+
+def save(cases, cc, key, description=''):
+    """Save cases and their combined case in the result cache.
+
+    Args:
+        cases (DataFrame): cases with a case column
+        cc (MultiCase): combined case
+        key (str): cache key
+        description (str): human readable description of the entry
+    """
+    entrydir = cache.create(key)
+    meta = cases.drop('case', axis=1)
+    meta.to_csv(path.join(entrydir, CASES_FILE))
+    for i, c in enumerate(cases.case):
+        save_case(c, path.join(entrydir, case_fname(i)))
+    save_case(cc, path.join(entrydir, COMBINED_FILE))
+    with open(path.join(entrydir, 'description.txt'), 'w') as f:
+        f.write(description)
+    cache.commit(key)
+    cache.evict()
+
+
+def load(key, scheme_id):
+    """Load cases and their combined case from the result cache.
+
+    Returns:
+        cases (DataFrame), cc (MultiCase)
+    """
+    entrydir = cache.entry_dir(key)
+    vpc = classification.VPC.load(scheme_id)
+    cases = pd.read_csv(path.join(entrydir, CASES_FILE), index_col=0,
+                        parse_dates=[multicase.COL_START, multicase.COL_END])
+    cases['case'] = [load_case(path.join(entrydir, case_fname(i)), vpc=vpc)
+                     for i in range(cases.shape[0])]
+    cc = load_case(path.join(entrydir, COMBINED_FILE), vpc=vpc)
+    cache.touch(key)
+    return cases, cc
+
+
+def cached(fun, cases_id, scheme_id, use_cache=True, **params):
+    """Cases and combined case from cache or by calling fun.
+
+    Args:
+        fun (function): fun(cases_id, scheme_id, **params) -> cases, cc
+        cases_id (str): case list name
+        scheme_id (str): classification scheme name
+        use_cache (bool): whether to use the result cache
+        **params: preprocessing parameters passed to fun
+
+    Returns:
+        cases (DataFrame), cc (MultiCase)
+    """
+    if not use_cache:
+        return fun(cases_id, scheme_id, **params)
+    key = cache_key(cases_id, scheme_id, fun=fun.__name__, **params)
+    if cache.exists(key):
+        print('Using cached profile data.')
+        return load(key, scheme_id)
+    cases, cc = fun(cases_id, scheme_id, **params)
+    description = '{} {} {}'.format(cases_id, scheme_id, params)
+    save(cases, cc, key, description=description)
+    return cases, cc
@@ -0,0 +1,113 @@
+# coding: utf-8
+"""class occurrence statistics over collections of cases
+
+The statistics are computed from a flat table of (case, time, class) rows of
+all profiles in a collection of cases.
+"""
+
+import numpy as np
+import pandas as pd
+
+from radcomp.vertical import multicase
+
+
+def flatten(cases):
+    """(case, time, class) of all classified profiles in a cases DataFrame
+
+    The case column is categorical with the case ids as categories.
+    Profiles without a class are dropped.
+    """
+    classes = [c.classes() for c in cases.case]
+    sizes = [cl.size for cl in classes]
+    codes = np.repeat(np.arange(len(sizes)), sizes)
+    times = np.concatenate([cl.index.values for cl in classes])
+    cl = np.concatenate([cl.values for cl in classes]).astype(float)
+    valid = ~np.isnan(cl)
+    flat = pd.DataFrame()
+    flat['case'] = pd.Categorical.from_codes(codes[valid],
+                                             categories=cases.index)
+    flat['time'] = times[valid]
+    flat['class'] = cl[valid].astype(int)
+    return flat
+
+
+def _codes(flat):
+    """case codes and classes as integer arrays"""
+    return flat['case'].cat.codes.values, flat['class'].values
+
+
+def streaks(flat):
+    """runs of consecutive equal classes within each case
+
+    Returns:
+        DataFrame: case, class and length of each run
+    """
+    codes, cl = _codes(flat)
+    change = np.ones(cl.size, dtype=bool)
+    change[1:] = (cl[1:] != cl[:-1]) | (codes[1:] != codes[:-1])
+    start = np.flatnonzero(change)
+    runs = pd.DataFrame()
+    runs['case'] = flat['case'].values[start]
+    runs['class'] = cl[start]
+    runs['length'] = np.diff(np.append(start, cl.size))
+    return runs
+
+
+def streak_counts(flat):
+    """number of runs of each length per class, streak by class"""
+    runs = streaks(flat)
+    count_df = pd.crosstab(runs['length'], runs['class'])
+    count_df.index.name = 'streak'
+    return count_df
+
+
+def class_counts(flat, n_classes=None):
+    """profile count of each class per case, class by case"""
+    codes, cl = _codes(flat)
+    cases = flat['case'].cat.categories
+    n_cases = cases.size
+    if n_classes is None:
+        n_classes = cl.max()+1
+    counts = np.bincount(cl*n_cases+codes, minlength=n_classes*n_cases)
+    counts = counts[:n_classes*n_cases].reshape(n_classes, n_cases)
+    index = pd.RangeIndex(n_classes, name='class')
+    return pd.DataFrame(counts, index=index, columns=cases)
+
+
+def class_fractions(flat, **kws):
+    """fraction of profiles in each class per case, class by case"""
+    counts = class_counts(flat, **kws)
+    return counts/counts.sum()
+
+
+def time_in_class(flat, timedelta, **kws):
+    """total time spent in each class per case, class by case"""
+    return class_counts(flat, **kws)*pd.Timedelta(timedelta)
+
+
+def incidence(flat, n_classes=None):
+    """boolean case by class matrix of class occurrence"""
+    inc, cids = multicase.class_incidence(np.asarray(flat['case']),
+                                          flat['class'].values,
+                                          n_classes=n_classes)
+    columns = pd.RangeIndex(inc.shape[1], name='class')
+    df = pd.DataFrame(inc.toarray() > 0, index=cids, columns=columns)
+    return df.reindex(flat['case'].cat.categories, fill_value=False)
+
+
+def occurrence(flat, frac=True, **kws):
+    """number or fraction of cases where each class occurs"""
+    occ = incidence(flat, **kws).sum()
+    if frac:
+        return occ/flat['case'].cat.categories.size
+    return occ
+
+
+def cooccurrence(flat, n_classes=None):
+    """number of cases where each pair of classes occurs, class by class"""
+    coocc = multicase.class_cooccurrence(np.asarray(flat['case']),
+                                         flat['class'].values,
+                                         n_classes=n_classes)
+    coocc.index.name = 'class'
+    coocc.columns.name = 'class'
+    return coocc
@@ -0,0 +1,160 @@
+# coding: utf-8
+"""resolution adaptive rendering of long height-time cross sections
+
+Data cells are pooled into bins matching the pixel resolution of the axes,
+and the pooled grid is drawn using imshow. The image is recomputed for the
+visible area when the axes limits change.
+"""
+
+import warnings
+
+import numpy as np
+import matplotlib as mpl
+
+
+def centers2edges(centers):
+    """cell edges from monotonic cell centers"""
+    centers = np.asarray(centers, dtype=float)
+    if centers.size < 2:
+        return np.concatenate((centers-0.5, centers+0.5))
+    mid = (centers[1:]+centers[:-1])/2
+    first = 2*centers[0]-mid[0]
+    last = 2*centers[-1]-mid[-1]
+    return np.concatenate(([first], mid, [last]))
+
+
+def bin_ranges(edges, bins):
+    """index ranges of cells overlapping each bin
+
+    Args:
+        edges (array): increasing cell edges, size n+1
+        bins (array): increasing bin edges, size k+1
+
+    Returns:
+        lo, hi (array): first and one past last overlapping cell of each bin
+        outside (array): boolean mask of bins outside the cells
+    """
+    starts = edges[:-1]
+    lo = np.searchsorted(starts, bins[:-1], side='right')-1
+    hi = np.searchsorted(starts, bins[1:], side='left')
+    lo = np.clip(lo, 0, starts.size-1)
+    hi = np.clip(np.maximum(hi, lo+1), 1, starts.size)
+    outside = (bins[1:] <= edges[0]) | (bins[:-1] >= edges[-1])
+    return lo, hi, outside
+
+
+def cumsums(values, axis=-1):
+    """nan-ignoring cumulative sums and counts along axis, zero prepended"""
+    values = np.moveaxis(values, axis, -1)
+    valid = np.isfinite(values)
+    zeros = np.zeros(values.shape[:-1]+(1,))
+    cs = np.concatenate((zeros, np.where(valid, values, 0).cumsum(axis=-1)),
+                        axis=-1)
+    cn = np.concatenate((zeros, valid.cumsum(axis=-1)), axis=-1)
+    return cs, cn
+
+
+def pool(values, edges, bins, axis=-1, how='mean', sums=None):
+    """Pool cells into bins along an axis ignoring nans.
+
+    Bins smaller than cells take the value of the overlapping cell.
+
+    Args:
+        values (array): data with cells along axis
+        edges (array): cell edges
+        bins (array): bin edges
+        axis (int): pooling axis
+        how (str): 'mean' or 'max'
+        sums (tuple, optional): precomputed cumsums of values along axis
+
+    Returns:
+        array: pooled values with bins along axis
+    """
+    lo, hi, outside = bin_ranges(edges, bins)
+    values = np.moveaxis(values, axis, -1)
+    if how == 'max':
+        nans = np.full(values.shape[:-1]+(1,), np.nan)
+        padded = np.concatenate((values, nans), axis=-1)
+        idx = np.column_stack((lo, hi)).ravel()
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            out = np.fmax.reduceat(padded, idx, axis=-1)[..., ::2]
+    elif how == 'mean':
+        cs, cn = sums or cumsums(values)
+        n = cn[..., hi]-cn[..., lo]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            out = np.where(n > 0, (cs[..., hi]-cs[..., lo])/n, np.nan)
+    else:
+        raise ValueError('Unknown pooling method {}'.format(how))
+    out[..., outside] = np.nan
+    return np.moveaxis(out, -1, axis)
+
+
+class DecimatedImage:
+    """imshow of a height-time grid pooled to axes pixel resolution
+
+    Attributes:
+        ax (Axes): axes to draw on
+        im (AxesImage): the image
+        how (str): pooling method, 'mean' or 'max'
+    """
+
+    def __init__(self, ax, x_edges, y_edges, values, how='mean', **kws):
+        self.ax = ax
+        self.how = how
+        self._x_edges = np.asarray(x_edges, dtype=float)
+        self._y_edges = np.asarray(y_edges, dtype=float)
+        self._values = np.asarray(values, dtype=float)
+        self._sums = None
+        if how == 'mean':
+            # time axis pooling sums are reused on every update
+            self._sums = cumsums(self._values, axis=1)
+        extent = (self._x_edges[0], self._x_edges[-1],
+                  self._y_edges[0], self._y_edges[-1])
+        self.im = ax.imshow(np.full((1, 1), np.nan), origin='lower',
+                            aspect='auto', interpolation='nearest',
+                            extent=extent, **kws)
+        # callbacks hold bound methods weakly, keep self alive with the image
+        self.im._decimated = self
+        self._updating = False
+        self.update()
+        ax.callbacks.connect('xlim_changed', self._on_lims_changed)
+        ax.callbacks.connect('ylim_changed', self._on_lims_changed)
+
+    def _view(self):
+        """visible data limits"""
+        x0, x1 = sorted(self.ax.get_xlim())
+        y0, y1 = sorted(self.ax.get_ylim())
+        x0, x1 = max(x0, self._x_edges[0]), min(x1, self._x_edges[-1])
+        y0, y1 = max(y0, self._y_edges[0]), min(y1, self._y_edges[-1])
+        return x0, x1, y0, y1
+
+    def shape(self):
+        """pixel (rows, columns) of the axes"""
+        bbox = self.ax.get_window_extent()
+        return max(int(bbox.height), 1), max(int(bbox.width), 1)
+
+    def update(self):
+        """Pool the visible data to the axes resolution."""
+        x0, x1, y0, y1 = self._view()
+        if (x0 >= x1) or (y0 >= y1):
+            return
+        n_rows, n_cols = self.shape()
+        xbins = np.linspace(x0, x1, n_cols+1)
+        ybins = np.linspace(y0, y1, n_rows+1)
+        pooled = pool(self._values, self._x_edges, xbins, axis=1,
+                      how=self.how, sums=self._sums)
+        pooled = pool(pooled, self._y_edges, ybins, axis=0, how=self.how)
+        self._updating = True
+        self.im.set_data(np.ma.masked_invalid(pooled))
+        self.im.set_extent((x0, x1, y0, y1))
+        self._updating = False
+
+    def _on_lims_changed(self, ax):
+        if not self._updating:
+            self.update()
+
+
+def date_edges(t):
+    """matplotlib date numbers of DatetimeIndex edges"""
+    return mpl.dates.date2num(t.to_pydatetime())
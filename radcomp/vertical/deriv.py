@@ -2,15 +2,63 @@
 """retrieval of secondary variables derived from radar or model data"""
 
 import numpy as np
+import pandas as pd
+
+
+def echotop_index(valid):
+    """row index of the highest True value in each column, -1 if none
+
+    Rows are assumed to be in ascending height order.
+    """
+    valid = np.asarray(valid, dtype=bool)
+    i = valid.shape[0]-1-valid[::-1].argmax(axis=0)
+    i[~valid.any(axis=0)] = -1
+    return i
+
+
+def take_at_index(values, i):
+    """values at row index i of each column, nan where i is negative"""
+    values = np.asarray(values, dtype=float)
+    out = values[i, np.arange(values.shape[1])]
+    out[i < 0] = np.nan
+    return out
+
+
+def _height_at_index(heights, i):
+    """heights at index i, nan where i is negative"""
+    h = np.asarray(heights, dtype=float)[i]
+    h[i < 0] = np.nan
+    return h
 
 
 def echotop(df):
     """highest index of each column with non-null data"""
-    isnull = df.isnull()
-    hghts = isnull.copy()
-    for col in hghts.columns:
-        hghts[col] = hghts.index
-    hghts[isnull] = np.nan
-    top = hghts.idxmax()
+    i = echotop_index(df.notnull().values)
+    top = pd.Series(_height_at_index(df.index, i), index=df.columns)
     top.name = 'echotop'
-    return top
\ No newline at end of file
+    return top
+
+
+def echotop_z(z, zmin=-8):
+    """echo top height based on reflectivity threshold
+
+    Profiles with no echo or with echo reaching the topmost level are nan.
+    """
+    i = echotop_index(z.values > zmin)
+    i[i == z.shape[0]-1] = -1
+    return pd.Series(_height_at_index(z.index, i), index=z.columns)
+
+
+def t_echotop(zh, t, fill=True):
+    """temperature at echo top
+
+    Args:
+        zh (DataFrame): reflectivity, height by time
+        t (DataFrame): temperature on the same grid
+        fill (bool): Use the lowest level where there is no echo.
+    """
+    i = echotop_index(zh.notnull().values)
+    if fill:
+        i[i < 0] = 0
+    return pd.Series(take_at_index(t.values, i), index=t.columns,
+                     name='t_top')
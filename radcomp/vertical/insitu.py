@@ -1,5 +1,8 @@
 # coding: utf-8
 import pickle
+from collections import OrderedDict
+from functools import lru_cache
+import numpy as np
 import pandas as pd
 from os import path
 from baecc import prepare
@@ -9,6 +12,13 @@ from j24 import home
 TABLE_PKL = path.join(CACHE_DIR, 'insitu_table.pkl')
 TABLE_FILTERED_PKL = path.join(CACHE_DIR, 'insitu_table_fltrd.pkl')
 EVENTS_PKL = path.join(CACHE_DIR, 'insitu_events.pkl')
+T_FMI_H5 = path.join(home(), 'DATA', 't_fmi_14-17.h5')
+FR_H5 = path.join(home(), 'DATA', 'FR_haoran.h5')
+PLUVIO_H5 = path.join(home(), 'DATA', 'pluvio14-16.h5')
+PLUVIO_TABLE_H5 = path.join(CACHE_DIR, 'pluvio14-16_table.h5')
+PLUVIO_KINDS = ('200', '400')
+MAX_RESAMPLED = 64 # resampled results kept per SeriesStore
+PLUVIO_CACHE_SIZE = 32 # Pluvio objects kept in memory
 
 def store_insitu(casesname_baecc='tiira2017_baecc',
                       casesname_1415='tiira2017_1415', cases=None, **kws):
@@ -35,20 +45,207 @@ def prep_table(e, cases=None, **kws):
         table.index.set_levels(cases.index, level=0, inplace=True)
     return table
 
+def _step_cumsum(x, T, v, T_prev=None, s_prev=0.):
+    """cumulative sum of backward filled values at integer points up to x
+
+    Sample i (at integer time T[i]) covers the points (T[i-1], T[i]].
+    """
+    if T_prev is None:
+        T_prev = T[0]-1
+    Tp = np.concatenate(([T_prev], T))
+    s = s_prev + np.concatenate(([0.], np.cumsum(v*np.diff(Tp))))
+    i = np.searchsorted(T, x, side='left')
+    return s[i] + v[i]*(x-Tp[i]), s[-1]
+
+
 def time_weighted_mean(data, rule='15min', resolution='1min', offset=None,
-                       **kws):
+                       base=0, chunksize=None):
+    """Time weighted mean of irregularly sampled data.
+
+    Each sample represents the period since the previous sample. The result
+    equals upsampling to resolution with backward filling and then averaging
+    over rule, but is computed from cumulative sums without the upsampled
+    intermediate.
+
+    Args:
+        data (Series): data with DatetimeIndex
+        rule: averaging interval
+        resolution: time resolution of the integration
+        offset: time offset of the result labels, default rule
+        base (float): bin origin in minutes after midnight
+        chunksize (int, optional): number of samples processed at a time
+
+    Returns:
+        Series: interval means labeled by interval start plus offset
+    """
     if offset is None:
         offset = rule
-    upsampled = data.resample(rule=resolution).bfill()
-    return upsampled.resample(rule=rule, loffset=pd.Timedelta(offset), **kws).mean()
+    data = data.sort_index()
+    res = pd.Timedelta(resolution).value
+    step = pd.Timedelta(rule).value
+    t = data.index.values.astype('datetime64[ns]').astype(np.int64)
+    if t.size == 0:
+        return pd.Series(name=data.name)
+    T = t//res
+    values = data.values.astype(float)
+    valid = ~np.isnan(values)
+    v = np.where(valid, values, 0.)
+    w = valid.astype(float)
+    day = pd.Timestamp(t[0]).floor('D').value
+    origin = day + int(pd.Timedelta(minutes=base).value)
+    k0 = (T[0]*res-origin)//step
+    k1 = (T[-1]*res-origin)//step
+    edges = origin + np.arange(k0, k1+2)*step
+    # last integer point before each bin edge
+    x = np.clip(np.ceil(edges/res)-1, T[0]-1, T[-1]).astype(np.int64)
+    sums = np.zeros(x.size)
+    counts = np.zeros(x.size)
+    chunksize = chunksize or T.size
+    T_prev, s_prev, c_prev = T[0]-1, 0., 0.
+    for i0 in range(0, T.size, chunksize):
+        i1 = i0+chunksize
+        Tc = T[i0:i1]
+        sel = (x > T_prev) & (x <= Tc[-1])
+        sums[sel], s_last = _step_cumsum(x[sel], Tc, v[i0:i1], T_prev, s_prev)
+        counts[sel], c_last = _step_cumsum(x[sel], Tc, w[i0:i1], T_prev,
+                                           c_prev)
+        T_prev, s_prev, c_prev = Tc[-1], s_last, c_last
+    n = np.diff(counts).round()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(n > 0, np.diff(sums)/n, np.nan)
+    index = pd.to_datetime(edges[:-1]) + pd.Timedelta(offset)
+    return pd.Series(mean, index=index, name=data.name)
+
+
+def resample_mean(data, rule='15min', **kws):
+    """resample wrapper for simple averaging"""
+    return data.resample(rule, **kws).mean()
+
+
+class SeriesStore:
+    """
+    Time series read lazily from HDF5 and kept in memory.
+
+    Attributes:
+        hdfpath (str): path to the HDF5 file
+        key (str): key in the HDF5 file
+        column (str): column to pick if the stored object is a DataFrame
+        name (str): name given to the series
+    """
+
+    def __init__(self, hdfpath, key='data', column=None, name=None):
+        self.hdfpath = hdfpath
+        self.key = key
+        self.column = column
+        self.name = name
+        self._data = None
+        self._resampled = OrderedDict()
+
+    @property
+    def data(self):
+        """lazy loading data"""
+        if self._data is None:
+            data = pd.read_hdf(self.hdfpath, self.key)
+            if self.column is not None:
+                data = data[self.column]
+            if self.name is not None:
+                data.name = self.name
+            self._data = data.sort_index()
+        return self._data
+
+    def exists(self):
+        """Check if the data file exists."""
+        return path.exists(self.hdfpath)
+
+    def range(self, start, end):
+        """data between datetimes"""
+        return self.data.loc[start:end]
+
+    def resampled(self, start, end, fun=resample_mean, **kws):
+        """data between datetimes resampled using fun
+
+        Up to MAX_RESAMPLED most recently used results are cached.
+        """
+        cache_key = (start, end, fun.__name__, tuple(sorted(kws.items())))
+        if cache_key in self._resampled:
+            self._resampled.move_to_end(cache_key)
+        else:
+            self._resampled[cache_key] = fun(self.range(start, end), **kws)
+            while len(self._resampled) > MAX_RESAMPLED:
+                self._resampled.popitem(last=False)
+        return self._resampled[cache_key].copy()
 
+    def clear_cache(self):
+        """Drop loaded data and resampled results."""
+        self._data = None
+        self._resampled = OrderedDict()
 
-def load_pluvio(start=None, end=None, kind='400'):
-    """Load Pluvio data from hdf5 database."""
+
+T_FMI = SeriesStore(T_FMI_H5, column='TC', name='temp_mean')
+FR = SeriesStore(FR_H5)
+
+
+def store_pluvio_table(hdfpath=PLUVIO_H5, tablepath=PLUVIO_TABLE_H5,
+                       kinds=PLUVIO_KINDS):
+    """Convert the pluvio archive to time indexed HDF tables.
+
+    The modification time of the source is stored alongside the tables.
+    """
+    with pd.HDFStore(tablepath, mode='w') as store:
+        store.put('source_mtime', pd.Series([path.getmtime(hdfpath)]))
+        for kind in kinds:
+            name = 'pluvio{}'.format(kind)
+            data = pd.read_hdf(hdfpath, key=name).sort_index()
+            store.put(name, data, format='table')
+            store.create_table_index(name, optlevel=9, kind='full')
+
+
+def pluvio_table_current(hdfpath=PLUVIO_H5, tablepath=PLUVIO_TABLE_H5):
+    """Check if the pluvio table was built from the current source."""
+    if not path.exists(tablepath):
+        return False
+    with pd.HDFStore(tablepath, mode='r') as store:
+        if 'source_mtime' not in store:
+            return False
+        mtime = store['source_mtime'].iloc[0]
+    return mtime == path.getmtime(hdfpath)
+
+
+def read_pluvio_range(name, start=None, end=None, hdfpath=PLUVIO_H5,
+                      tablepath=PLUVIO_TABLE_H5):
+    """Read pluvio data between datetimes from the indexed table.
+
+    The table is rebuilt if the source archive has changed.
+    """
+    if not pluvio_table_current(hdfpath=hdfpath, tablepath=tablepath):
+        store_pluvio_table(hdfpath=hdfpath, tablepath=tablepath)
+        _cached_pluvio.cache_clear()
+    where = []
+    if start is not None:
+        start = pd.Timestamp(start)
+        where.append('index>=start')
+    if end is not None:
+        end = pd.Timestamp(end)
+        where.append('index<=end')
+    return pd.read_hdf(tablepath, key=name, where=where or None)
+
+
+def _pluvio(name, start, end):
+    """Pluvio object of data between datetimes"""
     import baecc.instruments.pluvio as pl
-    name = 'pluvio{}'.format(str(kind))
-    hdfpath = path.join(home(), 'DATA', 'pluvio14-16.h5')
-    data = pd.read_hdf(hdfpath, key=name)[start:end]
-    pluv = pl.Pluvio(data=data, name=name)
-    return pluv
+    data = read_pluvio_range(name, start=start, end=end)
+    return pl.Pluvio(data=data, name=name)
+
 
+_cached_pluvio = lru_cache(maxsize=PLUVIO_CACHE_SIZE)(_pluvio)
+
+
+def load_pluvio(start=None, end=None, kind='400', use_cache=True):
+    """Load Pluvio data from hdf5 database.
+
+    Up to PLUVIO_CACHE_SIZE most recently used ranges are cached.
+    """
+    name = 'pluvio{}'.format(str(kind))
+    if use_cache:
+        return _cached_pluvio(name, start, end)
+    return _pluvio(name, start, end)
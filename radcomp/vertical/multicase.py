@@ -75,12 +75,11 @@ def plot_convective_occurrence(occ, ax=None, **kws):
 
 def ts_case_ids(cases):
     """case ids by timestamp"""
-    cids_list = []
-    for cid, c in cases.case.iteritems():
-        cids_list.append(c.timestamps().apply(lambda x: cid))
-    ts = pd.concat(cids_list)
-    ts.name = 'case'
-    return ts
+    t_list = [c.time_index() for c in cases.case]
+    sizes = [t.size for t in t_list]
+    t = t_list[0].append(t_list[1:])
+    return pd.Series(np.repeat(cases.index.values, sizes), index=t,
+                     name='case')
 
 
 def n_class_in_cases(class_n, cases, combined_cases=None):
@@ -90,8 +89,88 @@ def n_class_in_cases(class_n, cases, combined_cases=None):
         classes = pd.concat([c.vpc.classes for i, c in cases.case.iteritems()])
     elif combined_cases is not None:
         classes = combined_cases.classes
-    groups = classes.groupby(case_ids)
-    return groups.agg(lambda x: (x == class_n).sum())
+    return (classes == class_n).groupby(case_ids).sum()
+
+
+def class_incidence(case_ids, classes, n_classes=None):
+    """sparse binary case by class occurrence matrix
+
+    Args:
+        case_ids (array_like): case id of each profile
+        classes (array_like): class of each profile, nan if not classified
+        n_classes (int, optional): number of classes
+
+    Returns:
+        scipy.sparse.csr_matrix, Index: incidence matrix and its case ids
+    """
+    from scipy import sparse
+    codes, cids = pd.factorize(np.asarray(case_ids))
+    classes = np.asarray(classes, dtype=float)
+    valid = (codes >= 0) & ~np.isnan(classes)
+    cl = classes[valid].astype(int)
+    if n_classes is None:
+        n_classes = cl.max()+1
+    ones = np.ones(cl.size, dtype=np.int64)
+    inc = sparse.csr_matrix((ones, (codes[valid], cl)),
+                            shape=(cids.size, n_classes))
+    inc.data[:] = 1
+    return inc, pd.Index(cids, name='case')
+
+
+def class_cooccurrence(case_ids, classes, n_classes=None, logical_or=False,
+                       labels=None):
+    """number of cases where each pair of classes occurs
+
+    Args:
+        case_ids (array_like): case id of each profile
+        classes (array_like or DataFrame): class of each profile, or one
+            column of classes per classification scheme in which case
+            co-occurrence is computed also across schemes
+        n_classes (int or dict, optional): number of classes (per scheme)
+        logical_or (bool): Count cases with either of the classes instead.
+        labels (array_like, optional): class labels
+
+    Returns:
+        DataFrame: class by class co-occurrence counts
+    """
+    from scipy import sparse
+    if isinstance(classes, pd.DataFrame):
+        n_classes = n_classes or {}
+        blocks = []
+        default_labels = []
+        for scheme, cl in classes.iteritems():
+            inc, _ = class_incidence(case_ids, cl,
+                                     n_classes=n_classes.get(scheme))
+            blocks.append(inc)
+            default_labels += ['{}{}'.format(scheme, i)
+                               for i in range(inc.shape[1])]
+        inc = sparse.hstack(blocks).tocsr()
+    else:
+        inc, _ = class_incidence(case_ids, classes, n_classes=n_classes)
+        default_labels = range(inc.shape[1])
+    coocc = (inc.T*inc).toarray()
+    if logical_or:
+        occ = coocc.diagonal()
+        coocc = occ[:, np.newaxis] + occ[np.newaxis, :] - coocc
+    labels = default_labels if labels is None else labels
+    return pd.DataFrame(coocc, index=labels, columns=labels)
+
+
+def cases_class_cooccurrence(cases, cc, index_str=True, **kws):
+    """class co-occurrence in cases classified in a combined case
+
+    Args:
+        cases (DataFrame): cases with Case objects in column 'case'
+        cc (MultiCase): classified combination of the cases
+        index_str (bool): Use class labels instead of numbers.
+        **kws: passed to class_cooccurrence
+    """
+    ts = ts_case_ids(cases)
+    dat = pd.concat([ts, cc.classes()], axis=1).dropna()
+    if index_str:
+        kws['labels'] = cc.vpc.class_labels()
+    return class_cooccurrence(dat['case'].values, dat['class'].values,
+                              n_classes=cc.vpc.n_clusters, **kws)
 
 
 def plot_cases_with_class(cases, class_n, **kws):
@@ -102,10 +181,50 @@ def plot_cases_with_class(cases, class_n, **kws):
 
 
 class MultiCase(case.Case):
-    """A case object combined from multiple cases"""
-    def __init__(self, convective=None, **kws):
+    """
+    A case object combined from multiple cases
+
+    The data of the original cases is kept as separate parts and concatenated
+    only when the combined data is accessed.
+
+    Attributes:
+        parts (list of Panel): data of the original cases
+        convective (Series): convective flag per profile
+    """
+    def __init__(self, convective=None, parts=None, convective_rle=None,
+                 **kws):
+        self._data = None
+        self.parts = parts
         super().__init__(**kws)
-        self.convective = convective
+        self._convective = convective
+        self._convective_rle = convective_rle
+
+    @property
+    def data(self):
+        """combined data, concatenated on first access"""
+        if self._data is None and self.parts is not None:
+            self._data = pd.concat(self.parts, axis=2)
+        return self._data
+
+    @data.setter
+    def data(self, data):
+        self._data = data
+        if data is not None:
+            self.parts = None
+
+    @property
+    def convective(self):
+        """convective flag per profile"""
+        if self._convective is None and self._convective_rle is not None:
+            values, lengths = self._convective_rle
+            flags = np.repeat(values, lengths)
+            self._convective = pd.Series(flags, index=self.time_index())
+        return self._convective
+
+    @convective.setter
+    def convective(self, convective):
+        self._convective = convective
+        self._convective_rle = None
 
     @classmethod
     def by_combining(cls, cases, has_ml=None, vpc=None, **kws):
@@ -114,16 +233,33 @@ class MultiCase(case.Case):
             c.load_model_temperature()
         has_ml = has_ml or c.has_ml
         vpc = vpc or c.vpc
-        datas = list(cases.case.apply(lambda c: c.data)) # data of each case
-        data = pd.concat(datas, axis=2)
+        parts = [c.data for c in cases.case] # data of each case
         if 'convective' in cases:
-            conv_flags = []
-            for i, c in cases.case.iteritems():
-                flag_series = c.timestamps().apply(lambda x: c.is_convective)
-                conv_flags.append(flag_series)
+            values = [np.nan if c.is_convective is None else c.is_convective
+                      for c in cases.case]
+            lengths = [part.minor_axis.size for part in parts]
             kws['is_convective'] = None
-            kws['convective'] = pd.concat(conv_flags)
-        return cls(data=data, has_ml=has_ml, vpc=vpc, **kws)
+            kws['convective_rle'] = (np.array(values, dtype=float), lengths)
+        return cls(parts=parts, has_ml=has_ml, vpc=vpc, **kws)
+
+    def time_index(self):
+        """combined time axis without concatenating data"""
+        if self._data is None and self.parts is not None:
+            return self.parts[0].minor_axis.append([part.minor_axis for part
+                                                    in self.parts[1:]])
+        return super().time_index()
+
+    def prepare_cl_data(self, save=True, force_no_crop=False):
+        """Prepare unscaled classification data part by part if possible."""
+        materialized = (self._data is not None) or (self.parts is None)
+        if materialized or (self.has_ml and not force_no_crop):
+            return super().prepare_cl_data(save=save,
+                                           force_no_crop=force_no_crop)
+        cl_data = pd.concat([case.prep_data(part, self.vpc) for part
+                             in self.parts], axis=1)
+        if save and not force_no_crop:
+            self.cl_data = cl_data
+        return cl_data
 
     @classmethod
     def from_caselist(cls, name, filter_flag=None, **kws):
@@ -162,4 +298,4 @@ class MultiCase(case.Case):
         return fig, axarr, order
 
     def t_surface(self, **kws):
-        return super().t_surface(**kws).loc[self.data.minor_axis]
+        return super().t_surface(**kws).loc[self.time_index()]
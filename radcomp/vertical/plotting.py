@@ -14,10 +14,12 @@ from mpl_toolkits.mplot3d import Axes3D
 import radcomp.visualization as vis
 import j24.visualization as jvis
 from radcomp import vertical, learn
+from radcomp.vertical import decimation
 
 
 DATETIME_FMT_CSV = '%Y-%m-%d %H:%M'
 DISPLACEMENT_FACTOR = 0.5
+DECIMATE_MIN_PROFILES = 1500
 LABELS = dict(density='$\\rho$, kg$\,$m$^{-3}$',
               intensity='LWE, mm$\,$h$^{-1}$',
               liq='LWP, cm',
@@ -151,11 +153,17 @@ def nice_cb_ticks(cb, nbins=5, steps=(1, 5, 10), **kws):
 
 
 def _pn_fig(fig_scale_factor, n_rows, fig_h_factor=1.1, fig_w_factor=1,
-            **fig_kws):
-    """Initialize figure for plotpn."""
+            fig=None, **fig_kws):
+    """Initialize figure for plotpn, optionally reusing an existing figure."""
     fw = fig_scale_factor*fig_w_factor*8
     fh = fig_scale_factor*(3+fig_h_factor*n_rows)
-    return plt.figure(figsize=(fw, fh), **fig_kws)
+    if fig is None:
+        return plt.figure(figsize=(fw, fh), **fig_kws)
+    fig.clf()
+    fig.set_size_inches(fw, fh)
+    if 'dpi' in fig_kws:
+        fig.set_dpi(fig_kws['dpi'])
+    return fig
 
 
 def _pn_gs(fig_scale_factor, n_rows, left_extra=0):
@@ -217,12 +225,23 @@ def field_gamma(field):
 def plotpn(pn, fields=None, scaled=False, cmap='pyart_RefDiff', n_extra_ax=0,
            x_is_date=True, fig_scale_factor=0.65, fig_kws={'dpi': 110},
            n_ax_shift=0, has_ml=False, cmap_override={}, lim_override=False,
-           hlims=(0, 10e3), gs_kws={}, **kws):
-    """Plot Panel of VPs"""
+           hlims=(0, 10e3), gs_kws={}, fig=None, decimate=None,
+           pooling='mean', **kws):
+    """Plot Panel of VPs
+
+    An existing figure can be given as fig to be cleared and reused.
+
+    Long time series are drawn as images pooled to the axes resolution and
+    refined on zoom. By default decimation is used when the number of
+    profiles exceeds DECIMATE_MIN_PROFILES. The pooling method is given as
+    pooling, 'mean' or 'max'.
+    """
     if fields is None:
         fields = pn.items
+    if decimate is None:
+        decimate = x_is_date and (pn.minor_axis.size > DECIMATE_MIN_PROFILES)
     n_rows = len(fields) + n_extra_ax
-    fig = _pn_fig(fig_scale_factor, n_rows, **fig_kws)
+    fig = _pn_fig(fig_scale_factor, n_rows, fig=fig, **fig_kws)
     gs = _pn_gs(fig_scale_factor, n_rows, **gs_kws)
     axarr = []
     h = -1
@@ -231,6 +250,7 @@ def plotpn(pn, fields=None, scaled=False, cmap='pyart_RefDiff', n_extra_ax=0,
     # always include T in coords if available
     if ('T' in pn) and ('T' not in fields):
         coords += ['T']
+    fmt_coord = coord_formatter(pn, coords, x_is_date=x_is_date)
     # top axes
     for h in range(n_ax_shift):
         ax = fig.add_subplot(gs[h, 0])
@@ -253,12 +273,19 @@ def plotpn(pn, fields=None, scaled=False, cmap='pyart_RefDiff', n_extra_ax=0,
         kws.update(scalekws)
         x = _pn_x(pn[field], x_is_date)
         gamma = field_gamma(field)
-        im = ax.pcolormesh(x, pn[field].index,
-                           np.ma.masked_invalid(pn[field].values), cmap=cm,
-                           label=field, norm=colors.PowerNorm(gamma), **kws)
-        # coordinate string formatting
-        fmt_coord = lambda x, y: format_coord_pn(x, y, pn.loc[coords, :, :],
-                                                 x_is_date=x_is_date)
+        if decimate:
+            x_edges = decimation.date_edges(x) if x_is_date else x.values
+            y_edges = decimation.centers2edges(pn[field].index.values)
+            im = decimation.DecimatedImage(ax, x_edges, y_edges,
+                                           pn[field].values, how=pooling,
+                                           cmap=cm, label=field,
+                                           norm=colors.PowerNorm(gamma),
+                                           **kws).im
+        else:
+            im = ax.pcolormesh(x, pn[field].index,
+                               np.ma.masked_invalid(pn[field].values),
+                               cmap=cm, label=field,
+                               norm=colors.PowerNorm(gamma), **kws)
         ax.format_coord = fmt_coord
         #
         use_ml_label = has_ml and not x_is_date
@@ -454,10 +481,16 @@ def format_coord_xtime(x, y):
     return 'x={x}, y={y:.0f}'.format(x=num2tstr(x), y=y)
 
 
-def format_coord_pn(x, y, data, x_is_date=False):
-    """coordinate formatter replacement with data display"""
-    values = {}
-    for label in data.items:
+def coord_formatter(data, labels=None, x_is_date=False):
+    """coordinate formatter with data display
+
+    Only the value arrays of the displayed fields and the axes are kept.
+    """
+    labels = data.items if labels is None else labels
+    arrays = {label: data[label].values for label in labels}
+    t = data.minor_axis
+    h = data.major_axis
+    def fmt_coord(x, y):
         if x_is_date:
             try:
                 x = num2date(x)
@@ -466,14 +499,20 @@ def format_coord_pn(x, y, data, x_is_date=False):
                 pass
         else:
             x = round(x)
-        ix = data.minor_axis.get_loc(x, method='nearest')
-        iy = data.major_axis.get_loc(y, method='nearest')
-        values[label] = data[label].iloc[iy, ix]
-    if x_is_date:
-        xystr = format_coord_xtime(x, y)
-    else:
-        xystr = format_coord(x, y)
-    return ', '.join([xystr, dict2coord(values)])
+        ix = t.get_indexer([x], method='nearest')[0]
+        iy = h.get_indexer([y], method='nearest')[0]
+        values = {label: arr[iy, ix] for label, arr in arrays.items()}
+        if x_is_date:
+            xystr = format_coord_xtime(x, y)
+        else:
+            xystr = format_coord(x, y)
+        return ', '.join([xystr, dict2coord(values)])
+    return fmt_coord
+
+
+def format_coord_pn(x, y, data, x_is_date=False):
+    """coordinate formatter replacement with data display"""
+    return coord_formatter(data, x_is_date=x_is_date)(x, y)
 
 
 def plot_bm_stats(stat, ax=None, **kws):
@@ -0,0 +1,153 @@
+# coding: utf-8
+"""headless batch rendering of case quicklooks
+
+Figures are rendered with the Agg backend in a pool of worker processes.
+Each worker reuses a single figure across cases. A manifest of content
+signatures in the output directory is used to skip cases whose data, scheme,
+plotting options and source files of plotted extras have not changed since
+the previous run.
+"""
+
+import hashlib
+import json
+import multiprocessing
+from os import path
+
+import numpy as np
+import matplotlib.pyplot as plt
+
+from radcomp import azs
+from radcomp.vertical import insitu
+from radcomp.vertical.case import PLOT_EXTRAS
+from j24 import ensure_dir
+
+
+MANIFEST_FILE = 'quicklooks.json'
+
+_fig = None # figure template of a worker process
+
+
+def mtime(filepath):
+    """modification time of a file, None if missing"""
+    if not path.exists(filepath):
+        return None
+    return path.getmtime(filepath)
+
+
+def extras_sources(c, plot_extras=PLOT_EXTRAS):
+    """source file modification times of plotted extras
+
+    The extras themselves are not computed.
+    """
+    sources = dict()
+    if 'ts' in plot_extras:
+        sources['ts'] = mtime(insitu.T_FMI_H5)
+    if ('lwe' in plot_extras) and (c.pluvio is not None):
+        sources['lwe'] = (c.pluvio.name, mtime(insitu.PLUVIO_H5))
+    if 'azs' in plot_extras:
+        files = azs.P400SET
+        sources['azs'] = (azs.source_id(files),
+                          max([mtime(f) for f in files] or [0]))
+    if 'fr' in plot_extras:
+        sources['fr'] = mtime(insitu.FR_H5)
+    return sources
+
+
+def case_signature(c, **plot_kws):
+    """hash of case data, source files of plotted extras, classification
+    scheme and plot options"""
+    md5 = hashlib.md5()
+    data = c.data
+    for axis in (data.items, data.major_axis, data.minor_axis):
+        md5.update(axis.values.astype(str).tobytes())
+    md5.update(data.values.tobytes())
+    plot_extras = plot_kws.get('plot_extras', PLOT_EXTRAS)
+    scheme = None if c.vpc is None else c.vpc.name()
+    meta = [c.name(), c.t_start(), c.t_end(),
+            extras_sources(c, plot_extras=plot_extras), scheme, plot_kws]
+    md5.update(json.dumps(meta, sort_keys=True, default=str).encode())
+    return md5.hexdigest()
+
+
+def read_manifest(savedir):
+    """quicklook file name to signature mapping"""
+    manifest_file = path.join(savedir, MANIFEST_FILE)
+    if not path.exists(manifest_file):
+        return {}
+    with open(manifest_file) as f:
+        return json.load(f)
+
+
+def write_manifest(manifest, savedir):
+    """Write quicklook signatures to the output directory."""
+    with open(path.join(savedir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+
+def _init_worker():
+    """Use a non-interactive backend in the worker."""
+    plt.switch_backend('Agg')
+
+
+def render(c, filename, **kws):
+    """Render a case quicklook to file reusing the worker figure."""
+    global _fig
+    fig, _ = c.plot(fig=_fig, interactive=False, headless=True, **kws)
+    fig.savefig(filename, bbox_inches='tight')
+    _fig = fig
+
+
+def _render_task(task):
+    """worker wrapper of render"""
+    caseid, c, filename, kws = task
+    try:
+        render(c, filename, **kws)
+    except Exception as e:
+        return caseid, filename, str(e)
+    return caseid, filename, None
+
+
+def _tasks(cases_iterator, savedir, manifest, signatures, force, kws):
+    """render tasks of changed cases"""
+    for caseid, c in cases_iterator:
+        fname = c.name()+'.png'
+        signature = case_signature(c, **kws)
+        filename = path.join(savedir, fname)
+        unchanged = manifest.get(fname) == signature
+        if unchanged and path.exists(filename) and not force:
+            continue
+        signatures[filename] = (fname, signature)
+        yield caseid, c, filename, kws
+
+
+def render_batch(cases_iterator, savedir, processes=None, force=False,
+                 **kws):
+    """Render quicklooks of cases in parallel.
+
+    Args:
+        cases_iterator (iterable): (case id, Case) pairs
+        savedir (str): output directory
+        processes (int, optional): number of worker processes
+        force (bool): rerender also unchanged cases
+        **kws: passed to Case.plot
+
+    Returns:
+        dict: case id to error message of failed cases
+    """
+    ensure_dir(savedir)
+    manifest = read_manifest(savedir)
+    signatures = dict()
+    failed = dict()
+    tasks = _tasks(cases_iterator, savedir, manifest, signatures, force, kws)
+    with multiprocessing.Pool(processes, initializer=_init_worker) as pool:
+        for caseid, filename, err in pool.imap_unordered(_render_task, tasks):
+            fname, signature = signatures.pop(filename)
+            if err is None:
+                print(caseid)
+                manifest[fname] = signature
+            else:
+                print('{}: {}'.format(caseid, err))
+                failed[caseid] = err
+                manifest.pop(fname, None)
+    write_manifest(manifest, savedir)
+    return failed
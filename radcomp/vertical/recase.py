@@ -9,22 +9,67 @@ import numpy as np
 from radcomp.vertical import multicase
 
 
-def _icombine(comb, cases):
-    ccases = cases.iloc[comb]
-    c = multicase.MultiCase.by_combining(ccases)
-    # fill gaps with nans
-    c.data = c.data.resample('15min', axis=2, base=c.base_minute()).mean()
-    return c
+def case_positions(cases):
+    """positional index of the original case of each combined profile"""
+    sizes = [c.data.minor_axis.size for c in cases.case]
+    return np.repeat(np.arange(len(sizes)), sizes)
+
+
+def regroup(t, case_pos, classes, gap=datetime.timedelta(hours=12)):
+    """Group cases by echo gaps.
+
+    Args:
+        t (array_like): profile timestamps
+        case_pos (array_like): original case position of each profile
+        classes (array_like): profile classes, 0 meaning no echo
+        gap (timedelta): minimum echo gap between groups
+
+    Returns:
+        list: arrays of original case positions in each group
+    """
+    echo = np.asarray(classes) != 0
+    t_echo = np.asarray(t, dtype='datetime64[ns]')[echo]
+    pos_echo = np.asarray(case_pos)[echo]
+    if t_echo.size == 0:
+        return []
+    is_new = np.diff(t_echo) > np.timedelta64(pd.Timedelta(gap))
+    splits = np.flatnonzero(is_new)+1
+    return [np.unique(pos) for pos in np.split(pos_echo, splits)]
 
 
-def _icomb_bool(comb, column, cases):
-    conv = cases[column].iloc[comb]
-    if conv.isnull().any():
-        return np.nan
-    if conv.any() != conv.all():
-        return np.nan
-        raise ValueError('Conflict in boolean flags.')
-    return conv.astype(bool).any().astype(float)
+def comb_bool_flags(combinations, column, cases):
+    """Combine boolean flags of the cases in each combination.
+
+    nan if any flag is missing or the flags are in conflict.
+    """
+    lens = [comb.size for comb in combinations]
+    members = np.concatenate(combinations)
+    group = np.repeat(np.arange(len(combinations)), lens)
+    values = cases[column].values.astype(float)[members]
+    null = np.isnan(values)
+    n_null = np.bincount(group, weights=null)
+    n_true = np.bincount(group, weights=~null & (values != 0))
+    flags = (n_true > 0).astype(float)
+    conflict = (n_true > 0) & (n_true < lens)
+    flags[(n_null > 0) | conflict] = np.nan
+    return flags
+
+
+def _subcase(cc, case_pos, comb, cases):
+    """MultiCase of given cases as a slice of the combined case"""
+    i = np.flatnonzero(np.isin(case_pos, comb))
+    if i[-1]-i[0]+1 == i.size:
+        i = slice(i[0], i[-1]+1)
+    last = cases.case.iloc[comb[-1]]
+    c = multicase.MultiCase(data=cc.data.iloc[:, :, i], has_ml=last.has_ml,
+                            vpc=last.vpc)
+    if cc.convective is not None:
+        c.convective = cc.convective.iloc[i]
+    t = c.data.minor_axis.values
+    if (np.diff(t) > np.timedelta64(15, 'm')).any():
+        # fill gaps with nans
+        c.data = c.data.resample('15min', axis=2, base=c.base_minute()).mean()
+    return c
 
 
 def grouper_orig(cc):
@@ -49,30 +94,24 @@ def echo_gaps(cc):
 def combine_cases_t_thresh(cases, gap=datetime.timedelta(hours=12)):
     """Combine cases with echo gaps less than threshold."""
     cc = multicase.MultiCase.by_combining(cases)
-    grpr_orig = grouper_orig(cc)
-    egaps = echo_gaps(cc)
-    grouper_new = (egaps>gap).cumsum()+10000
-    groupers = pd.concat([grouper_new, grpr_orig], axis=1)
-    g_drop=groupers.dropna()
-    g = g_drop.g_orig.groupby(g_drop.echo_gap)
-    combinations = g.unique()
-    case = combinations.apply(_icombine, args=[cases])
+    case_pos = case_positions(cases)
+    combinations = regroup(cc.data.minor_axis.values, case_pos,
+                           cc.classes().values, gap=gap)
+    case = pd.Series([_subcase(cc, case_pos, comb, cases)
+                      for comb in combinations])
     case.index = case.apply(lambda x: x.name())
-    combinations.index = case.index
     case.name = 'case'
     case.index.name = 'id'
-    start = combinations.apply(lambda comb: cases.start.iloc[comb[0]])
-    start.name = 'start'
-    end = combinations.apply(lambda comb: cases.end.iloc[comb[-1]])
-    end.name = 'end'
-    ml = combinations.apply(_icomb_bool, args=['ml', cases])
-    ml.name = 'ml'
-    #comment = combinations.apply(lambda comb: '; '.join(cases.comment.iloc[comb].values))
-    cases_new = pd.concat((start, end, ml, case), axis=1)
-    if 'ml_ok' in cases.columns:
-        cases_new['ml_ok'] = combinations.apply(_icomb_bool, args=['ml_ok', cases])
-    if 'convective' in cases.columns:
-        cases_new['convective'] = combinations.apply(_icomb_bool, args=['convective', cases])
+    first = [comb[0] for comb in combinations]
+    last = [comb[-1] for comb in combinations]
+    cases_new = pd.DataFrame(index=case.index)
+    cases_new['start'] = cases.start.values[first]
+    cases_new['end'] = cases.end.values[last]
+    cases_new['ml'] = comb_bool_flags(combinations, 'ml', cases)
+    cases_new['case'] = case
+    for column in ('ml_ok', 'convective'):
+        if column in cases.columns:
+            cases_new[column] = comb_bool_flags(combinations, column, cases)
     return cases_new, cc
 
 
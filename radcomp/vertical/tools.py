@@ -3,7 +3,7 @@
 Vertical profile classification
 @author: Jussi Tiira
 """
-import numpy as np
+from radcomp.vertical import deriv
 
 
 def m2km(m, pos):
@@ -12,6 +12,5 @@ def m2km(m, pos):
 
 
 def echo_top_h(z, zmin=-8):
-    top = (z>zmin).loc[::-1].idxmax()
-    top[top==z.index[-1]] = np.nan
-    return top
+    """deriv.echotop_z wrapper"""
+    return deriv.echotop_z(z, zmin=zmin)
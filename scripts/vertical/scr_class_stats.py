@@ -2,7 +2,6 @@
 """class statistics and comparison"""
 
 import datetime
-import pickle
 from os import path
 
 import numpy as np
@@ -10,8 +9,8 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib as mpl
 
-from radcomp import CACHE_DIR
-from radcomp.vertical import multicase, plotting, recase, RESULTS_DIR
+from radcomp.vertical import (multicase, plotting, recase, class_stats,
+                              case_cache, RESULTS_DIR)
 from j24.datetools import strfdelta
 
 import conf
@@ -21,32 +20,8 @@ import plot_wrappers
 BOXPROPS = dict(whis=[2.5, 97.5], manage_xticks=False, sym='')
 
 
-def consecutive_grouper(s):
-    """Consecutive values to have same integer -> 111223333455"""
-    return (s != s.shift()).cumsum()
-
-
-def pkl_dump(var, filepath):
-    with open(filepath, 'wb') as f:
-        pickle.dump(var, f)
-
-
-def pkl_load(filepath):
-    """pickle.load wrapper"""
-    with open(filepath, 'rb') as f:
-        return pickle.load(f)
-
-
-def init_data(cases_id, scheme_id, has_ml=False, use_cache=False, **kws):
-    """initialize cases data"""
-    if use_cache:
-        cases_fname = 'cases_{}{}.pkl'.format(cases_id, scheme_id)
-        cases_file = path.join(CACHE_DIR, cases_fname)
-        cc_fname = 'cc_{}{}.pkl'.format(cases_id, scheme_id)
-        cc_file = path.join(CACHE_DIR, cc_fname)
-        if path.exists(cases_file) and path.exists(cc_file):
-            print('Using cached profile data.')
-            return pkl_load(cases_file), pkl_load(cc_file)
+def classify_cases(cases_id, scheme_id, has_ml=False):
+    """read and classify cases, and combine cases by echo gaps"""
     cases = multicase.read_cases(cases_id)
     if has_ml:
         cases = cases[cases.ml_ok.astype(bool)]
@@ -57,12 +32,15 @@ def init_data(cases_id, scheme_id, has_ml=False, use_cache=False, **kws):
     cc.load_classification(scheme_id)
     for i, c in cases.case.iteritems():
         c.load_classification(scheme_id)
-    if use_cache:
-        pkl_dump(cases, cases_file)
-        pkl_dump(cc, cc_file)
     return cases, cc
 
 
+def init_data(cases_id, scheme_id, has_ml=False, use_cache=False):
+    """initialize cases data"""
+    return case_cache.cached(classify_cases, cases_id, scheme_id,
+                             use_cache=use_cache, has_ml=has_ml)
+
+
 def init_snow(cases_id=conf.CASES_SNOW, scheme_id=conf.SCHEME_ID_SNOW, **kws):
     """initialize snow data"""
     return init_data(cases_id, scheme_id, has_ml=False, **kws)
@@ -84,18 +62,10 @@ def streaks_table(g_counts):
 
 
 def class_streak_counts(cases):
-    """average consecutive occurrence streak per class"""
-    class_list = []
-    count_list = []
-    for i, c in cases.case.iteritems():
-        g = c.classes().groupby(consecutive_grouper(c.classes()))
-        class_list.append(g.mean())
-        count_list.append(g.count())
-    classes = pd.concat(class_list)
-    counts = pd.concat(count_list)
-    counts.name = 'count'
-    g_class_counts = counts.groupby(classes)
-    return g_class_counts
+    """consecutive occurrence streaks grouped by class"""
+    runs = class_stats.streaks(class_stats.flatten(cases))
+    counts = runs['length'].rename('count')
+    return counts.groupby(runs['class'])
 
 
 def class_streak_avg_time(cases):
@@ -113,20 +83,13 @@ def count2time_ticks(n, pos):
     return time_ticks(n*15, pos)
 
 
-def class_count(classes):
-    """count of each class in series of classes"""
-    return classes.groupby(classes).count()
-
-
-def class_frac(classes):
-    """fraction of each class in series of classes"""
-    return class_count(classes) / classes.shape[0]
-
-
-def class_agg(cases, agg_fun=class_frac):
-    """aggregate class occurrences"""
-    fracs = [agg_fun(c.classes()) for i, c in cases.case.iteritems()]
-    return pd.concat(fracs, axis=1)
+def class_agg(cases, frac=True):
+    """class occurrence fractions or counts per case, nan if not present"""
+    flat = class_stats.flatten(cases)
+    n_classes = cases.case[0].vpc.n_clusters
+    counts = class_stats.class_counts(flat, n_classes=n_classes)
+    agg = counts/counts.sum() if frac else counts
+    return agg.where(counts > 0)
 
 
 def plot_class_streak_counts(cases, ax=None, order=None):
@@ -155,15 +118,10 @@ def plot_class_streak_counts(cases, ax=None, order=None):
 
 def occ_in_cases(cases, frac=True):
     """number or fraction of cases where each class occurs"""
-    counts = []
-    for cl_id in cases.case[0].vpc.get_class_list():
-        count = 0
-        for _, c in cases.case.iteritems():
-            count += cl_id in c.classes().values
-        counts.append(count)
-    if frac:
-        return np.array(counts)/cases.shape[0]
-    return counts
+    n_classes = cases.case[0].vpc.n_clusters
+    occ = class_stats.occurrence(class_stats.flatten(cases), frac=frac,
+                                 n_classes=n_classes)
+    return occ.values
 
 
 def cl_frac_in_classes(classes, cl, frac=True):
@@ -231,7 +189,7 @@ def barplot_class_stats(fracs, class_color=None, ax=None):
 
 def barplot_nanmedian_class_frac(cases, class_color, ax=None):
     ax = ax or plt.gca()
-    barplot_class_stats(class_agg(cases, agg_fun=class_frac).median(axis=1), class_color, ax=ax)
+    barplot_class_stats(class_agg(cases, frac=True).median(axis=1), class_color, ax=ax)
     ax.set_ylabel('Median\nfraction')
     ax.set_ylim(bottom=0, top=0.3)
 
@@ -239,14 +197,14 @@ def barplot_nanmedian_class_frac(cases, class_color, ax=None):
 def boxplot_class_frac(cases, class_color, ax=None):
     ax = ax or plt.gca()
     pos = range(0, cases.case[0].vpc.n_clusters)
-    class_agg(cases, agg_fun=class_frac).T.boxplot(ax=ax, positions=pos, **BOXPROPS)
+    class_agg(cases, frac=True).T.boxplot(ax=ax, positions=pos, **BOXPROPS)
     ax.set_ylabel('Fraction of profiles\nper event')
     ax.set_ylim(bottom=0, top=1.02)
 
 
 def barplot_mean_class_frac(cases, class_color, ax=None):
     ax = ax or plt.gca()
-    barplot_class_stats(class_agg(cases, agg_fun=class_frac).fillna(0).mean(axis=1),
+    barplot_class_stats(class_agg(cases, frac=True).fillna(0).mean(axis=1),
                         class_color, ax=ax)
     ax.set_ylabel('mean occ.\nfraction')
     ax.set_ylim(bottom=0, top=0.8)
@@ -254,7 +212,7 @@ def barplot_mean_class_frac(cases, class_color, ax=None):
 
 def barplot_nanmedian_class_count(cases, class_color, ax=None):
     ax = ax or plt.gca()
-    barplot_class_stats(class_agg(cases, agg_fun=class_count).median(axis=1), class_color, ax=ax)
+    barplot_class_stats(class_agg(cases, frac=False).median(axis=1), class_color, ax=ax)
     ax.set_ylabel('Median\nprofile count')
     ax.set_ylim(bottom=0, top=30)
 
@@ -262,7 +220,7 @@ def barplot_nanmedian_class_count(cases, class_color, ax=None):
 def boxplot_class_count(cases, class_color, ax=None):
     ax = ax or plt.gca()
     pos = range(0, cases.case[0].vpc.n_clusters)
-    class_agg(cases, agg_fun=class_count).T.boxplot(ax=ax, positions=pos, **BOXPROPS)
+    class_agg(cases, frac=False).T.boxplot(ax=ax, positions=pos, **BOXPROPS)
     ax.set_ylabel('Profile count\nper event')
     ax.set_yscale('log')
     ax.set_ylim(bottom=0.9, top=100)
@@ -274,7 +232,7 @@ def boxplot_class_time(cases, class_color, ax=None): # TODO
     locs = np.array([20,30,40,50,2*60,3*60,4*60,5*60,6*60,7*60,8*60,9*60,20*60])/15
     minorlocator = mpl.ticker.FixedLocator(locs)
     formatter = mpl.ticker.FuncFormatter(count2time_ticks)
-    class_agg(cases, agg_fun=class_count).T.boxplot(ax=ax, positions=pos, **BOXPROPS)
+    class_agg(cases, frac=False).T.boxplot(ax=ax, positions=pos, **BOXPROPS)
     ax.set_yscale('log')
     ax.yaxis.set_major_formatter(formatter)
     ax.yaxis.set_minor_locator(minorlocator)
@@ -288,7 +246,7 @@ def boxplot_class_time(cases, class_color, ax=None): # TODO
 
 def barplot_mean_class_count(cases, class_color, ax=None):
     ax = ax or plt.gca()
-    barplot_class_stats(class_agg(cases, agg_fun=class_count).fillna(0).mean(axis=1),
+    barplot_class_stats(class_agg(cases, frac=False).fillna(0).mean(axis=1),
                         class_color, ax=ax)
     ax.set_ylabel('mean\ncount')
     ax.set_ylim(bottom=0, top=30)
@@ -1,7 +1,6 @@
 # coding: utf-8
 """Analyze profile class co-occurrence."""
 
-import pandas as pd
 import matplotlib.pyplot as plt
 
 from radcomp.vertical import multicase
@@ -9,22 +8,8 @@ from radcomp.vertical import multicase
 
 def cl_coocc(cases, cc, index_str=True, logical_or=False):
     """profile class co-occurrence"""
-    ts = multicase.ts_case_ids(cases)
-    cl = cc.classes()
-    dat = pd.concat([ts, cl], axis=1).dropna()
-    datu = dat.drop_duplicates()
-    datu['class'] = datu['class'].astype(int)
-    bmat = datu.groupby(['case', 'class']).size().unstack(fill_value=0)
-    if logical_or:
-        bmat = (-bmat.astype(bool)).astype(int)
-    coocc = bmat.T.dot(bmat)
-    if logical_or:
-        coocc = cases.shape[0]-coocc
-    if index_str:
-        clarr = cc.vpc.class_labels()
-        coocc.index = clarr
-        coocc.columns = clarr
-    return coocc
+    return multicase.cases_class_cooccurrence(cases, cc, index_str=index_str,
+                                              logical_or=logical_or)
 
 
 def imshow_coocc(coocc, percent=True, ax=None):
@@ -3,7 +3,7 @@
 import pandas as pd
 from os import path
 from datetime import datetime
-from radcomp.tools.rhi import mat_workflow
+from radcomp.tools.rhi import batch_extract
 
 
 DATE_FMT = '%Y%m%d%H%M'
@@ -30,7 +30,7 @@ if __name__ == '__main__':
     resultsdir = path.join(home, 'DATA1', 'vprhi')
     listfile = path.join(home, 'ika_rhi.list')
     files = read_filelist(listfile)
-    for dirname in files.dirname.unique():
-        datadir = path.join(datapath, dirname)
-        mat_workflow(datadir, resultsdir)
+    filepaths = files.relpath.apply(lambda p: path.join(datapath, p))
+    manifest = batch_extract(filepaths.sort_values().values, resultsdir)
+    print(manifest[manifest.status != 'ok'])
 
@@ -8,7 +8,7 @@ from glob import glob
 from warnings import warn
 from datetime import datetime, timedelta
 from radcomp import CACHE_TMP_DIR
-from radcomp.vertical import case, classification, plotting, RESULTS_DIR
+from radcomp.vertical import case, classification, plotting, insitu, RESULTS_DIR
 from j24 import home, ensure_join
 
 plt.ioff()
@@ -49,7 +49,7 @@ def dates():
     date_end.name = 'end'
     date_end.index = date_start.index
     date = pd.concat([date_start, date_end], axis=1)
-    dates_t = pd.read_hdf(path.join(DATADIR, 't_fmi_14-17.h5'), 'data').index
+    dates_t = insitu.T_FMI.data.index
     sdates_t = pd.Series(dates_t, index=dates_t)
     uniqdates_t = sdates_t.apply(lambda t: t.date()).unique()
     return date.loc[uniqdates_t].dropna()
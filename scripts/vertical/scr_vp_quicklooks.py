@@ -9,23 +9,24 @@ import pandas as pd
 import matplotlib.pyplot as plt
 
 from radcomp import USER_DIR
-from radcomp.vertical import case, multicase, RESULTS_DIR
+from radcomp.vertical import case, multicase, quicklooks, RESULTS_DIR
 from j24 import ensure_join
 
 
 def plot_quicklooks(cases_iterator, save=True, saveid='everything',
-                    params=None, savedir=None, **kws):
-    """Plot and save quicklooks."""
+                    params=None, savedir=None, processes=None, **kws):
+    """Plot and save quicklooks.
+
+    When saving, quicklooks of changed cases are rendered in parallel.
+    """
     params = params or ['zh', 'zdr', 'kdp', 'RHO']
     if save:
         savedir = savedir or ensure_join(RESULTS_DIR, 'quicklooks', saveid)
+        return quicklooks.render_batch(cases_iterator, savedir, params=params,
+                                       processes=processes, **kws)
     for caseid, c in cases_iterator:
         print(caseid)
-        fig, _ = c.plot(params=params, **kws)
-        if save:
-            filename = path.join(savedir, c.name()+'.png')
-            fig.savefig(filename, bbox_inches='tight')
-            plt.close(fig)
+        c.plot(params=params, **kws)
 
 
 def datetime_df(datelistfile):
@@ -2,7 +2,6 @@
 
 import os
 from glob import glob
-from copy import deepcopy
 
 import pyart
 import numpy as np
@@ -108,11 +107,9 @@ if __name__ == '__main__':
     #ds2.KDP.T.plot(vmax=0.3)
     #c = hyycase(outdir)
     #c.plot()
-    vrhi = get_vrhi()
-    rs = np.arange(50000, 80000, 5000)
-    vps = {}
-    for r in rs:
-        vr = deepcopy(vrhi)
-        vps[r]=make_vp(vr, r)
+    vs = get_vs()
+    azims = np.arange(0, 180, 10)
+    rs = np.arange(50000, 105000, 5000)
+    ds = rhi.volume_profiles(vs, azims, rs)
 
 
@@ -0,0 +1,52 @@
+# coding: utf-8
+"""Test RADX grid minimum detectable reflectivity."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('netCDF4')
+from radcomp.qpe import radx
+
+
+def kerava_grid(scan_seconds):
+    """Kerava grid without a file, scan task guessed from scan time"""
+    grid = radx.RADXgrid.__new__(radx.RADXgrid)
+    grid._data = None
+    grid._site = 'KER'
+    grid._scantime = pd.Timedelta(seconds=scan_seconds)
+    grid._task_name = None
+    grid._radar_pixel = (2, 1)
+    grid._z_min = None
+    grid.equalize_dbz = False
+    grid.x = np.arange(5)*1e3
+    grid.y = np.arange(4)*1e3
+    shape = (grid.y.size, grid.x.size)
+    dbz = np.ma.masked_array(np.full(shape, -10.))
+    rhohv = np.ma.masked_array(np.ones(shape))
+    grid._vars = {('DBZ_TOT', 0, 0): dbz, ('RHOHV', 0, 0): rhohv}
+    return grid
+
+
+## TESTS
+
+def test_z_min_unknown_task():
+    """unknown scan task should give a fully masked z_min masking nothing"""
+    grid = kerava_grid(80)
+    assert grid.task_name is None
+    z_min = grid.z_min
+    assert z_min.shape == (4, 5)
+    assert np.ma.getmaskarray(z_min).all()
+    assert np.isnan(z_min.data).all()
+    assert not grid.mask().any()
+
+
+def test_z_min_known_task():
+    """z_min should grow with distance from the radar pixel"""
+    grid = kerava_grid(200)
+    assert grid.task_name == 'VOL_A'
+    z_min = grid.z_min
+    assert np.isneginf(z_min[1, 2])
+    ref = grid.z_min_xy(4, 3)
+    assert np.isclose(z_min[3, 4], ref)
+    assert grid.mask()[3, 4] == (-10 < ref)
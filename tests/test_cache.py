@@ -0,0 +1,56 @@
+# coding: utf-8
+"""Test the size bounded result cache."""
+
+import os
+from os import path
+
+import pytest
+from radcomp import cache
+
+
+def add_entry(key, size, mtime, cachedir):
+    """committed cache entry of a file of given size and last use time"""
+    entrydir = cache.create(key, cachedir=cachedir)
+    with open(path.join(entrydir, 'data.bin'), 'wb') as f:
+        f.write(b'\0'*size)
+    cache.commit(key, cachedir=cachedir)
+    os.utime(cache.entry_dir(key, cachedir=cachedir), (mtime, mtime))
+
+
+@pytest.fixture
+def cachedir(tmp_path):
+    """cache directory with entries used in order a, b, c"""
+    cachedir = str(tmp_path)
+    for i, key in enumerate('abc'):
+        add_entry(key, 100, 1e9+i, cachedir)
+    return cachedir
+
+
+## TESTS
+
+def test_hash_key():
+    """keys should depend on content, not on keyword order"""
+    assert cache.hash_key(1, a=2, b=3) == cache.hash_key(1, b=3, a=2)
+    assert cache.hash_key(1, a=2) != cache.hash_key(1, a=3)
+
+
+def test_partial_entry_hidden(cachedir):
+    """uncommitted entries should not exist"""
+    cache.create('d', cachedir=cachedir)
+    assert not cache.exists('d', cachedir=cachedir)
+    assert [e[0] for e in cache.entries(cachedir=cachedir)] == list('abc')
+
+
+def test_evict_lru(cachedir):
+    """least recently used entries should be evicted first"""
+    cache.touch('a', cachedir=cachedir)
+    removed = cache.evict(max_size=200, cachedir=cachedir)
+    assert removed == ['b']
+    assert [e[0] for e in cache.entries(cachedir=cachedir)] == ['c', 'a']
+
+
+def test_evict_within_limit(cachedir):
+    """nothing should be evicted below the size limit"""
+    assert cache.evict(max_size=300, cachedir=cachedir) == []
+    assert cache.evict(max_size=0, cachedir=cachedir) == list('abc')
+    assert cache.entries(cachedir=cachedir) == []
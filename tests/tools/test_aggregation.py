@@ -0,0 +1,91 @@
+# coding: utf-8
+"""Test aggregation of stacked radar fields."""
+
+import numpy as np
+import pandas as pd
+import pytest
+from radcomp.tools import aggregation, db2lin, lin2db
+
+KEYS = ['ZH', 'ZDR', 'KDP', 'RHO']
+
+
+def reference(fields, keys, stat, window):
+    """per field pandas aggregation, dB fields in linear space"""
+    out = []
+    for key in keys:
+        data = fields[key][:, window].filled(np.nan).astype(float)
+        if key in aggregation.DB_SCALED_VARS:
+            data = db2lin(data)
+        agg = getattr(pd.DataFrame(data), stat)(axis=1).values
+        if key in aggregation.DB_SCALED_VARS:
+            agg = lin2db(agg)
+        out.append(agg)
+    return np.array(out)
+
+
+@pytest.fixture
+def fields():
+    """masked radar fields with fully masked rays"""
+    rs = np.random.RandomState(0)
+    shape = (30, 200)
+    scales = dict(ZH=(10, 8), ZDR=(0.5, 0.5), KDP=(0.1, 0.2),
+                  RHO=(0.97, 0.02))
+    fields = dict()
+    for key, (loc, scale) in scales.items():
+        data = rs.normal(loc, scale, size=shape)
+        mask = rs.rand(*shape) < 0.3
+        mask[0] = True
+        fields[key] = np.ma.masked_array(data, mask=mask)
+    return fields
+
+
+## TESTS
+
+@pytest.mark.parametrize('stat', ['mean', 'median'])
+def test_aggregate(fields, stat):
+    """aggregation should match pandas with dB fields in linear space"""
+    window = slice(50, 120)
+    stacked = aggregation.stack(fields, KEYS, window=window)
+    assert stacked.dtype == aggregation.DTYPE
+    agg = aggregation.aggregate(stacked, KEYS, stat=stat)
+    ref = reference(fields, KEYS, stat, window)
+    assert np.isnan(agg[:, 0]).all()
+    assert np.allclose(agg, ref, rtol=1e-5, atol=1e-5, equal_nan=True)
+
+
+def test_aggregate_callable(fields):
+    """functions taking axis argument should be accepted"""
+    stacked = aggregation.stack(fields, KEYS)
+    agg = aggregation.aggregate(stacked.copy(), KEYS, stat=np.nanmax)
+    ref = reference(fields, KEYS, 'max', slice(None))
+    assert np.allclose(agg, ref, rtol=1e-5, atol=1e-5, equal_nan=True)
+
+
+def test_percentiles(fields):
+    """percentile dimension should be prepended"""
+    q = [25, 50, 75]
+    stacked = aggregation.stack(fields, KEYS)
+    median = aggregation.aggregate(stacked.copy(), KEYS)
+    pct = aggregation.aggregate(stacked, KEYS, stat='percentile', q=q)
+    assert pct.shape == (len(q),) + median.shape
+    assert np.allclose(pct[1], median, rtol=1e-5, equal_nan=True)
+
+
+def test_stack_mask(fields):
+    """gates outside the mask should be nan"""
+    mask = np.zeros(fields['ZH'].shape, dtype=bool)
+    mask[:, :10] = True
+    stacked = aggregation.stack(fields, KEYS, mask=mask)
+    assert np.isnan(stacked[..., 10:]).all()
+    valid = ~fields['ZH'].mask[:, :10]
+    assert np.allclose(stacked[0, :, :10][valid], fields['ZH'][:, :10][valid])
+
+
+def test_work_buffer_reuse():
+    """work buffers should be reused per shape and bounded in number"""
+    a = aggregation.work_buffer((2, 3))
+    assert aggregation.work_buffer((2, 3)) is a
+    assert aggregation.work_buffer((3, 2)) is not a
+    for n in range(aggregation.MAX_WORK_BUFFERS+1):
+        aggregation.work_buffer((n+10,))
+    assert len(aggregation._work) == aggregation.MAX_WORK_BUFFERS
@@ -0,0 +1,97 @@
+# coding: utf-8
+"""Test KDP retrieval caching."""
+
+from os import path
+
+import numpy as np
+import pytest
+
+pytest.importorskip('pyart')
+from radcomp import cache
+from radcomp.tools import kdp
+
+
+class GateRadar:
+    """minimal radar object with a differential phase field"""
+
+    def __init__(self, nrays=4, ngates=50):
+        self.nrays = nrays
+        self.ngates = ngates
+        self.range = dict(data=np.arange(ngates)*250.)
+        phidp = np.tile(np.linspace(0, 10, ngates), (nrays, 1))
+        phidp = np.ma.masked_array(phidp)
+        self.fields = dict(differential_phase=dict(data=phidp))
+
+    def init_gate_x_y_z(self):
+        pass
+
+    def init_gate_longitude_latitude(self):
+        pass
+
+    def init_gate_altitude(self):
+        pass
+
+
+CALLS = []
+
+
+@kdp.register('test')
+def gradient(radar, scale=1):
+    """phase gradient as KDP"""
+    CALLS.append(radar.ngates)
+    fdp = radar.fields['differential_phase']['data']
+    return np.ma.masked_array(np.gradient(fdp, axis=1)*scale), fdp
+
+
+@pytest.fixture
+def source(tmp_path, monkeypatch):
+    """input file path with the KDP cache in a temporary directory"""
+    monkeypatch.setattr(kdp, 'KDP_CACHE_DIR', str(tmp_path/'kdp'))
+    filepath = tmp_path/'scan.raw'
+    filepath.write_bytes(b'data')
+    del CALLS[:]
+    return str(filepath)
+
+
+## TESTS
+
+def test_cached_window(source):
+    """only the computed window should be cached and expanded on load"""
+    radar = GateRadar()
+    gates = slice(10, 30)
+    kd, fd = kdp.retrieve(radar, method='test', gates=gates, source=source)
+    assert kd.shape == (radar.nrays, radar.ngates)
+    assert kd.mask[:, :10].all() and kd.mask[:, 30:].all()
+    (key, _, _), = cache.entries(cachedir=kdp.KDP_CACHE_DIR)
+    filepath = path.join(kdp.KDP_CACHE_DIR, key, kdp.CACHE_FNAME)
+    with np.load(filepath) as data:
+        assert data['kdp'].shape == (radar.nrays, 20)
+    kd_cached, fd_cached = kdp.retrieve(radar, method='test', gates=gates,
+                                        source=source)
+    assert CALLS == [20]
+    assert np.ma.allequal(kd_cached, kd) and np.ma.allequal(fd_cached, fd)
+    assert (kd_cached.mask == kd.mask).all()
+
+
+def test_params_in_key(source):
+    """method parameters should be part of the cache key"""
+    radar = GateRadar()
+    kd1, _ = kdp.retrieve(radar, method='test', source=source)
+    kd2, _ = kdp.retrieve(radar, method='test', source=source, scale=2)
+    assert CALLS == [radar.ngates]*2
+    assert np.ma.allclose(kd2, 2*kd1)
+
+
+def test_eviction(source, monkeypatch):
+    """the cache should be kept below the size limit"""
+    radar = GateRadar()
+    kdp.retrieve(radar, method='test', source=source)
+    (_, _, size), = cache.entries(cachedir=kdp.KDP_CACHE_DIR)
+    monkeypatch.setattr(kdp, 'KDP_MAX_SIZE', 2.5*size)
+    for scale in range(2, 6):
+        kdp.retrieve(radar, method='test', source=source, scale=scale)
+    entries = cache.entries(cachedir=kdp.KDP_CACHE_DIR)
+    assert 0 < len(entries) < 5
+    assert sum(entry[2] for entry in entries) <= kdp.KDP_MAX_SIZE
+    kdp.retrieve(radar, method='test', source=source, scale=5)
+    assert len(CALLS) == 5
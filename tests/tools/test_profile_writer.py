@@ -0,0 +1,70 @@
+# coding: utf-8
+"""Test the streaming profile writer."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+nc = pytest.importorskip('netCDF4')
+from radcomp.tools.profile_writer import ProfileWriter
+
+HEIGHTS = np.arange(100, 10000, 50, dtype=float)
+
+
+def linear_profile(heights):
+    """profile linear in height"""
+    heights = np.asarray(heights, dtype=float)
+    return pd.DataFrame({'ZH': 20-heights/500, 'ZDR': heights/1e4},
+                        index=heights)
+
+
+@pytest.fixture
+def filepath(tmp_path):
+    """output file path"""
+    return str(tmp_path/'profiles.nc')
+
+
+def read(filepath, name):
+    """stored variable as (time, height) array"""
+    with nc.Dataset(filepath) as ds:
+        return ds.variables[name][:].filled(np.nan)
+
+
+## TESTS
+
+def test_jittered_heights(filepath):
+    """profiles on jittered heights should be interpolated to the axis"""
+    rs = np.random.RandomState(0)
+    jittered = np.sort(HEIGHTS[5:-5] + rs.uniform(-60, 60, HEIGHTS.size-10))
+    with ProfileWriter(filepath, heights=HEIGHTS) as writer:
+        assert writer.append('2014-02-01 00:00', linear_profile(HEIGHTS))
+        assert writer.append('2014-02-01 00:05', linear_profile(jittered))
+    zh = read(filepath, 'ZH')
+    assert zh.shape == (2, HEIGHTS.size)
+    assert np.allclose(zh[0], linear_profile(HEIGHTS)['ZH'], atol=1e-4)
+    inside = (HEIGHTS >= jittered[0]) & (HEIGHTS <= jittered[-1])
+    assert np.allclose(zh[1, inside], zh[0, inside], atol=1e-4)
+    assert np.isnan(zh[1, ~inside]).all()
+
+
+def test_gaps_kept(filepath):
+    """missing values should not be filled by interpolation"""
+    df = linear_profile(HEIGHTS)
+    df.iloc[10:20] = np.nan
+    with ProfileWriter(filepath) as writer:
+        writer.append('2014-02-01', df)
+    zh = read(filepath, 'ZH')[0]
+    assert np.isnan(zh[10:20]).all()
+    assert np.isfinite(np.delete(zh, np.arange(10, 20))).all()
+
+
+def test_append_existing(filepath):
+    """reopened files should skip stored times and keep the height axis"""
+    with ProfileWriter(filepath) as writer:
+        writer.append('2014-02-01 00:00', linear_profile(HEIGHTS))
+    with ProfileWriter(filepath) as writer:
+        assert '2014-02-01 00:00' in writer
+        assert not writer.append('2014-02-01 00:00', linear_profile(HEIGHTS))
+        assert writer.append('2014-02-01 00:05', linear_profile(HEIGHTS+10))
+        assert np.allclose(writer.heights, HEIGHTS)
+    assert read(filepath, 'ZDR').shape == (2, HEIGHTS.size)
@@ -0,0 +1,20 @@
+# coding: utf-8
+"""Test the case result cache."""
+
+import numpy as np
+import pytest
+from radcomp.vertical import case_cache
+
+
+## TESTS
+
+@pytest.mark.parametrize('flag', [None, np.nan, False, True])
+def test_tristate_roundtrip(tmp_path, flag):
+    """unknown convectivity should not be restored as True"""
+    filepath = str(tmp_path/'flag.npz')
+    np.savez_compressed(filepath,
+                        is_convective=case_cache.tristate_code(flag))
+    with np.load(filepath) as f:
+        restored = case_cache.TRISTATE[int(f['is_convective'])]
+    expected = None if flag is None or np.isnan(flag) else flag
+    assert restored is expected
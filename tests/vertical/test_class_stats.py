@@ -0,0 +1,48 @@
+# coding: utf-8
+"""Test class statistics over case collections."""
+
+import numpy as np
+import pandas as pd
+import pytest
+from radcomp.vertical import class_stats
+
+
+class ClassifiedCase:
+    """minimal case with precomputed classes"""
+
+    def __init__(self, classes):
+        self._classes = classes
+
+    def classes(self):
+        return self._classes
+
+
+@pytest.fixture
+def cases():
+    """cases with unclassified profiles"""
+    t = pd.date_range('2014-02-01', periods=6, freq='15min')
+    cl0 = pd.Series([0, 0, np.nan, 2, 2, 1], index=t, name='class')
+    cl1 = pd.Series([np.nan, 1, 1, 1, np.nan, 3], index=t, name='class')
+    cl2 = pd.Series([np.nan]*3, index=t[:3], name='class')
+    cc = [ClassifiedCase(cl) for cl in (cl0, cl1, cl2)]
+    return pd.DataFrame({'case': cc}, index=['a', 'b', 'c'])
+
+
+## TESTS
+
+def test_flatten_drops_unclassified(cases):
+    """profiles without a class should be dropped"""
+    flat = class_stats.flatten(cases)
+    assert list(flat['class']) == [0, 0, 2, 2, 1, 1, 1, 1, 3]
+    assert list(flat['case']) == ['a']*5 + ['b']*4
+    assert list(flat['case'].cat.categories) == ['a', 'b', 'c']
+    t = cases.case['a'].classes().dropna().index
+    assert (flat['time'].values[:5] == t.values).all()
+
+
+def test_class_counts(cases):
+    """class counts should include cases with no classified profiles"""
+    counts = class_stats.class_counts(class_stats.flatten(cases))
+    assert list(counts['a']) == [2, 1, 2, 0]
+    assert list(counts['b']) == [0, 3, 0, 1]
+    assert list(counts['c']) == [0, 0, 0, 0]
@@ -0,0 +1,74 @@
+# coding: utf-8
+"""Test resolution adaptive rendering."""
+
+import gc
+import warnings
+
+import numpy as np
+import pytest
+import matplotlib.pyplot as plt
+from radcomp.vertical import decimation
+
+
+def pool_loop(values, edges, bins, how='mean'):
+    """reference pooling of columns by looping over bins"""
+    fun = dict(mean=np.nanmean, max=np.nanmax)[how]
+    centers = (edges[1:]+edges[:-1])/2
+    out = np.full((values.shape[0], bins.size-1), np.nan)
+    for j, (b0, b1) in enumerate(zip(bins[:-1], bins[1:])):
+        cols = (centers >= b0) & (centers < b1)
+        if cols.any() and np.isfinite(values[:, cols]).any():
+            out[:, j] = fun(values[:, cols], axis=1)
+    return out
+
+
+@pytest.fixture
+def grid():
+    """height-time grid with missing values"""
+    rs = np.random.RandomState(0)
+    values = rs.normal(size=(20, 300))
+    values[rs.rand(*values.shape) < 0.2] = np.nan
+    x_edges = np.arange(301, dtype=float)
+    y_edges = decimation.centers2edges(np.arange(100, 4100, 200))
+    return x_edges, y_edges, values
+
+
+## TESTS
+
+@pytest.mark.parametrize('how', ['mean', 'max'])
+def test_pool(grid, how):
+    """pooling with aligned bins should match the bin loop"""
+    x_edges, _, values = grid
+    bins = x_edges[::7]
+    pooled = decimation.pool(values, x_edges, bins, axis=1, how=how)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        ref = pool_loop(values, x_edges, bins, how=how)
+    assert np.allclose(pooled, ref, equal_nan=True)
+
+
+def test_pool_outside(grid):
+    """bins outside the cells should be nan"""
+    x_edges, _, values = grid
+    bins = np.array([-20, -10, 0, 10, 300, 310])
+    pooled = decimation.pool(values, x_edges, bins, axis=1)
+    assert np.isnan(pooled[:, [0, 1, 4]]).all()
+
+
+def test_repooled_on_xlim_change(grid):
+    """zooming in should re-pool the image after the reference is dropped"""
+    plt.switch_backend('Agg')
+    fig, ax = plt.subplots(figsize=(2, 1), dpi=50)
+    x_edges, y_edges, values = grid
+    decimation.DecimatedImage(ax, x_edges, y_edges, values)
+    im = ax.get_images()[0]
+    gc.collect()
+    ax.set_xlim(10, 20)
+    assert tuple(im.get_extent()[:2]) == (10, 20)
+    n_rows, n_cols = im.get_array().shape
+    xbins = np.linspace(10, 20, n_cols+1)
+    ybins = np.linspace(y_edges[0], y_edges[-1], n_rows+1)
+    ref = decimation.pool(values, x_edges, xbins, axis=1)
+    ref = decimation.pool(ref, y_edges, ybins, axis=0)
+    assert np.allclose(im.get_array().filled(np.nan), ref, equal_nan=True)
+    plt.close(fig)
@@ -0,0 +1,82 @@
+# coding: utf-8
+"""Test retrieval of derived variables."""
+
+import numpy as np
+import pandas as pd
+import pytest
+from radcomp.vertical import deriv
+
+
+def echotop_index_loop(valid):
+    """reference echo top index by looping over columns"""
+    out = []
+    for col in np.asarray(valid).T:
+        rows = np.flatnonzero(col)
+        out.append(rows[-1] if rows.size else -1)
+    return np.array(out)
+
+
+@pytest.fixture
+def zh():
+    """reflectivity profiles with empty and saturated columns"""
+    rs = np.random.RandomState(0)
+    heights = np.arange(200, 10200, 200)
+    times = pd.date_range('2014-02-01', periods=40, freq='15min')
+    values = rs.uniform(-20, 30, size=(heights.size, times.size))
+    values[rs.rand(*values.shape) < 0.3] = np.nan
+    values[:, 0] = np.nan
+    values[:, 1] = 10
+    return pd.DataFrame(values, index=heights, columns=times)
+
+
+## TESTS
+
+def test_echotop_index(zh):
+    """echo top index should match the column loop"""
+    valid = zh.notnull().values
+    i = deriv.echotop_index(valid)
+    assert np.array_equal(i, echotop_index_loop(valid))
+    assert i[0] == -1
+
+
+def test_take_at_index():
+    """values at negative indices should be nan"""
+    values = np.arange(12).reshape(4, 3)
+    out = deriv.take_at_index(values, np.array([0, -1, 3]))
+    assert np.allclose(out, [0, np.nan, 11], equal_nan=True)
+
+
+def test_echotop(zh):
+    """echo top should be the highest height with data"""
+    top = deriv.echotop(zh)
+    for t, col in zh.items():
+        valid = col.dropna()
+        ref = valid.index[-1] if valid.size else np.nan
+        assert np.isclose(top[t], ref, equal_nan=True)
+
+
+def test_echotop_z(zh):
+    """echo top reaching the topmost level should be nan"""
+    zmin = 0
+    top = deriv.echotop_z(zh, zmin=zmin)
+    for t, col in zh.items():
+        echo = col[col > zmin]
+        if echo.empty or echo.index[-1] == zh.index[-1]:
+            assert np.isnan(top[t])
+        else:
+            assert top[t] == echo.index[-1]
+
+
+@pytest.mark.parametrize('fill', [True, False])
+def test_t_echotop(zh, fill):
+    """temperature at echo top, lowest level if no echo and fill"""
+    t = pd.DataFrame(np.linspace(0, -40, zh.size).reshape(zh.shape),
+                     index=zh.index, columns=zh.columns)
+    t_top = deriv.t_echotop(zh, t, fill=fill)
+    i = echotop_index_loop(zh.notnull().values)
+    for j, col in enumerate(zh.columns):
+        if i[j] < 0:
+            ref = t[col].iloc[0] if fill else np.nan
+        else:
+            ref = t[col].iloc[i[j]]
+        assert np.isclose(t_top[col], ref, equal_nan=True)
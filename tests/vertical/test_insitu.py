@@ -0,0 +1,40 @@
+# coding: utf-8
+"""Test in situ data tools."""
+
+import numpy as np
+import pandas as pd
+import pytest
+from radcomp.vertical import insitu
+
+
+def upsampled_mean(data, rule='15min', resolution='1min', offset=None,
+                   **kws):
+    """reference time weighted mean using upsampling"""
+    if offset is None:
+        offset = rule
+    upsampled = data.resample(rule=resolution).bfill()
+    return upsampled.resample(rule=rule, loffset=pd.Timedelta(offset),
+                              **kws).mean()
+
+
+@pytest.fixture
+def irregular_series():
+    """irregularly sampled series with gaps"""
+    rs = np.random.RandomState(0)
+    dt = pd.to_timedelta(np.cumsum(rs.randint(1, 600, size=300)), unit='s')
+    values = rs.normal(size=dt.size)
+    values[rs.rand(dt.size) < 0.1] = np.nan
+    return pd.Series(values, index=pd.Timestamp('2014-02-01 03:00')+dt)
+
+
+## TESTS
+
+@pytest.mark.parametrize('base', [0, 3, -4.5])
+@pytest.mark.parametrize('chunksize', [None, 7])
+def test_time_weighted_mean(irregular_series, base, chunksize):
+    """time weighted mean should match the upsampling implementation"""
+    twm = insitu.time_weighted_mean(irregular_series, base=base, offset=0,
+                                    chunksize=chunksize)
+    ref = upsampled_mean(irregular_series, base=base, offset=0)
+    assert twm.index.equals(ref.index)
+    assert np.allclose(twm.values, ref.values, equal_nan=True)